@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""On-demand Excel export of the stored Boletín Oficial regulations."""
+
+import sys
+
+from src.config import load_config, setup_logging
+from src.storage import export_regulations_excel
+
+
+def main() -> int:
+    """Main entry point for the Excel export."""
+    config = load_config()
+    logger = setup_logging("export", config.log_dir)
+
+    try:
+        export_regulations_excel(config)
+        return 0
+
+    except Exception as e:
+        logger.exception(f"Error during export: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
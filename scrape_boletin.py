@@ -3,10 +3,11 @@
 
 import sys
 
+from src.batch import classify_regulations_batch, discard_batch_run, new_run_id
 from src.classifier import classify_regulations
 from src.config import load_config, setup_logging, validate_config
 from src.scraper import scrape_regulations
-from src.storage import save_regulations
+from src.storage import export_regulations_excel, save_regulations
 
 
 def main() -> int:
@@ -25,18 +26,31 @@ def main() -> int:
             logger.warning("No regulations found")
             return 0
 
-        # Classify and filter relevant regulations
-        relevant = classify_regulations(regulations, config)
+        # Classify and filter relevant regulations; the Batch API is cheaper
+        # but waits until OpenAI completes the batch
+        run_id = None
+        if config.use_batch_api:
+            run_id = new_run_id()
+            relevant = classify_regulations_batch(regulations, config, run_id)
+        else:
+            relevant = classify_regulations(regulations, config)
 
         if relevant.empty:
             logger.info(
                 f"No relevant regulations found (threshold: {config.relevance_threshold})"
             )
-            return 0
-
-        # Save to Excel
-        save_regulations(relevant, config)
-        logger.info(f"Saved {len(relevant)} relevant regulations")
+        else:
+            # Save to the dataset and refresh the Excel export, unless it is
+            # generated on demand with export_excel.py
+            save_regulations(relevant, config)
+            if config.export_excel:
+                export_regulations_excel(config)
+            logger.info(f"Saved {len(relevant)} relevant regulations")
+
+        # The batch run is only dropped once saved, so the collect deployment
+        # can pick it up again if saving failed
+        if run_id is not None:
+            discard_batch_run(config, run_id)
 
         return 0
 
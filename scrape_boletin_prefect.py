@@ -5,13 +5,19 @@ from __future__ import annotations
 
 import sys
 
-from prefect import flow, get_run_logger, task
+from prefect import flow, get_run_logger, serve, task
 from prefect.client.schemas.schedules import CronSchedule
 
+from src.batch import (
+    collect_classification_batch,
+    discard_batch_run,
+    pending_runs,
+    submit_classification_batch,
+)
 from src.classifier import classify_regulations
 from src.config import load_config, setup_logging, validate_config
 from src.scraper import scrape_regulations
-from src.storage import save_regulations
+from src.storage import export_regulations_excel, save_regulations
 
 
 @task(name="scrape_regulations", retries=2, retry_delay_seconds=60)
@@ -41,6 +47,8 @@ def scrape_regulations_task() -> int:
             return 0
 
         save_regulations(relevant, config)
+        if config.export_excel:
+            export_regulations_excel(config)
         logger.info("Saved %s relevant regulations", len(relevant))
 
         return 0
@@ -50,12 +58,103 @@ def scrape_regulations_task() -> int:
         return 1
 
 
+@task(name="submit_classification_batch", retries=2, retry_delay_seconds=60)
+def submit_batch_task() -> int:
+    """Scrape regulations and submit their classification as an OpenAI batch."""
+    config = load_config()
+    setup_logging("scraper", config.log_dir)
+    logger = get_run_logger()
+
+    try:
+        validate_config(config)
+        logger.info("Starting Boletín Oficial scraper (batch submit)")
+
+        regulations = scrape_regulations()
+
+        if regulations.empty:
+            logger.warning("No regulations found")
+            return 0
+
+        batch_id = submit_classification_batch(regulations, config)
+        logger.info("Submitted classification batch %s", batch_id)
+
+        return 0
+
+    except Exception:
+        logger.exception("Error during batch submission")
+        return 1
+
+
+# A pending batch raises so Prefect retries the task until OpenAI finishes it;
+# retries span 50 hours, since the classification and enrichment batches can
+# each take up to 24
+@task(name="collect_classification_batch", retries=100, retry_delay_seconds=1800)
+def collect_batch_task() -> int:
+    """Collect every pending batch run, then persist its relevant regulations."""
+    config = load_config()
+    setup_logging("scraper", config.log_dir)
+    logger = get_run_logger()
+    validate_config(config)
+
+    runs = pending_runs(config)
+    if not runs:
+        logger.warning("No pending batch to collect")
+        return 0
+
+    running = []
+    for run_id in runs:
+        relevant = collect_classification_batch(config, run_id)
+        if relevant is None:
+            running.append(run_id)
+            continue
+
+        if relevant.empty:
+            logger.info(
+                "No relevant regulations found in run %s (threshold: %s)",
+                run_id,
+                config.relevance_threshold,
+            )
+            discard_batch_run(config, run_id)
+            continue
+
+        # The run is kept until its regulations are saved, so after a failed
+        # save the next collect run picks it up again
+        try:
+            save_regulations(relevant, config)
+            if config.export_excel:
+                export_regulations_excel(config)
+            logger.info(
+                "Saved %s relevant regulations from run %s", len(relevant), run_id
+            )
+        except Exception:
+            logger.exception("Error while saving batch results")
+            return 1
+        discard_batch_run(config, run_id)
+
+    if running:
+        raise RuntimeError(f"Batch runs still running: {', '.join(running)}")
+
+    return 0
+
+
 @flow(name="boletin-oficial-daily-scraper")
 def scrape_boletin_flow() -> int:
     """Prefect flow wrapper for the daily Boletín Oficial scraper."""
     return scrape_regulations_task()
 
 
+@flow(name="boletin-oficial-batch-submit")
+def submit_batch_flow() -> int:
+    """Prefect flow that scrapes and submits the day's classification batch."""
+    return submit_batch_task()
+
+
+@flow(name="boletin-oficial-batch-collect")
+def collect_batch_flow() -> int:
+    """Prefect flow that collects the day's classification batch."""
+    return collect_batch_task()
+
+
 def main() -> int:
     """CLI entry point (kept for backwards compatibility)."""
     return scrape_boletin_flow()
@@ -65,14 +164,27 @@ if __name__ == "__main__":
     import sys
 
     if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        timezone = "America/Argentina/Buenos_Aires"
         # serve() runs a long-lived process that executes scheduled runs locally
-        scrape_boletin_flow.serve(
-            name="scrape-boletin-daily",
-            schedules=[
-                CronSchedule(
-                    cron="0 8 * * *", timezone="America/Argentina/Buenos_Aires"
-                )
-            ],
-        )
+        if load_config().use_batch_api:
+            # Submit at 08:00 and collect an hour later, at the batch discount
+            serve(
+                submit_batch_flow.to_deployment(
+                    name="scrape-boletin-submit",
+                    schedules=[CronSchedule(cron="0 8 * * *", timezone=timezone)],
+                ),
+                # One collect run at a time; a run still retrying yesterday's
+                # batches makes today's wait instead of collecting them twice
+                collect_batch_flow.to_deployment(
+                    name="scrape-boletin-collect",
+                    schedules=[CronSchedule(cron="0 9 * * *", timezone=timezone)],
+                    concurrency_limit=1,
+                ),
+            )
+        else:
+            scrape_boletin_flow.serve(
+                name="scrape-boletin-daily",
+                schedules=[CronSchedule(cron="0 8 * * *", timezone=timezone)],
+            )
     else:
         sys.exit(main())
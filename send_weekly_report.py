@@ -4,7 +4,11 @@
 import sys
 
 from src.config import load_config, setup_logging, validate_config
-from src.email_service import enviar_email, generar_html_email_styled
+from src.email_service import (
+    REPORT_COLUMNS,
+    enviar_email,
+    generar_html_email_styled,
+)
 from src.storage import get_recent_regulations
 
 
@@ -31,7 +35,9 @@ def main() -> int:
             logger.info(f"Sending to {len(recipient)} recipients")
 
         # Get recent regulations
-        regulations = get_recent_regulations(config, days=7, archive_old=True)
+        regulations = get_recent_regulations(
+            config, days=7, archive_old=True, columns=REPORT_COLUMNS
+        )
 
         if regulations.empty:
             logger.warning("No regulations found for the past 7 days")
@@ -9,7 +9,11 @@ from prefect import flow, get_run_logger, task
 from prefect.client.schemas.schedules import CronSchedule
 
 from src.config import load_config, setup_logging, validate_config
-from src.email_service import enviar_email, generar_html_email_styled
+from src.email_service import (
+    REPORT_COLUMNS,
+    enviar_email,
+    generar_html_email_styled,
+)
 from src.storage import get_recent_regulations
 
 
@@ -33,7 +37,9 @@ def send_weekly_report_task(days: int = 7) -> int:
             ]
             logger.info("Sending to %s recipients", len(recipient))
 
-        regulations = get_recent_regulations(config, days=days, archive_old=True)
+        regulations = get_recent_regulations(
+            config, days=days, archive_old=True, columns=REPORT_COLUMNS
+        )
 
         if regulations.empty:
             logger.warning("No regulations found for the past %s days", days)
@@ -0,0 +1,463 @@
+"""Classification through the OpenAI Batch API, for runs that can wait for results."""
+
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+from src.classifier import (
+    CLASSIFY_FALLBACK,
+    CLASSIFY_MAX_TOKENS_PER_TEXT,
+    ENRICH_MAX_TOKENS,
+    classify_messages,
+    classify_results,
+    classify_texts,
+    enrich_messages,
+    enrich_texts,
+    enrichment_result,
+    join_enrichment,
+    select_candidates,
+    select_relevant,
+)
+from src.config import Config
+from src.llm import get_client
+from src.llm_cache import LLMCache, make_key
+from src.models import BatchRelevanceClassification, RegulationEnrichment
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = 300
+
+# Batch statuses after which no more results will arrive
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Files kept between submitting a batch and collecting its results, in one
+# directory per run so a run still pending is never overwritten by the next
+INPUT_FILE = "input.jsonl"
+OUTPUT_FILE = "output.jsonl"
+STATE_FILE = "pending.json"
+REGULATIONS_FILE = "pending.parquet"
+
+
+def batch_dir(config: Config) -> Path:
+    """Return the directory holding one subdirectory per pending batch run."""
+    return config.data_dir / "batch"
+
+
+def pending_runs(config: Config) -> list[str]:
+    """Return the ids of the batch runs waiting to be collected, oldest first."""
+    states = batch_dir(config).glob(f"*/{STATE_FILE}")
+    return sorted(path.parent.name for path in states)
+
+
+def new_run_id() -> str:
+    """Return a run id that sorts by submission time."""
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def discard_batch_run(config: Config, run_id: str) -> None:
+    """Delete a collected batch run once its regulations have been saved."""
+    shutil.rmtree(batch_dir(config) / run_id)
+
+
+def _close_objects(schema: dict) -> dict:
+    """Forbid extra keys on every object of a JSON schema, as strict mode needs."""
+    if schema.get("type") == "object":
+        schema["additionalProperties"] = False
+    for value in schema.values():
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if isinstance(child, dict):
+                _close_objects(child)
+    return schema
+
+
+def _response_format(response_model: type[BaseModel]) -> dict:
+    """Return the strict structured output format for a model."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_model.__name__,
+            "schema": _close_objects(response_model.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+def _request_line(custom_id: int, body: dict) -> dict:
+    """Wrap a chat completion body as one line of a batch input file."""
+    return {
+        "custom_id": str(custom_id),
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": body,
+    }
+
+
+def build_batch_requests(groups: list[list[str]], model: str) -> list[dict]:
+    """Build one classification request line per group of texts, by position."""
+    response_format = _response_format(BatchRelevanceClassification)
+    return [
+        _request_line(
+            n,
+            {
+                "model": model,
+                "messages": classify_messages(texts),
+                "response_format": response_format,
+                "temperature": 0,
+                "max_tokens": CLASSIFY_MAX_TOKENS_PER_TEXT * len(texts),
+            },
+        )
+        for n, texts in enumerate(groups)
+    ]
+
+
+def build_enrich_requests(texts: list[str], model: str) -> list[dict]:
+    """Build one enrichment request line per text, by position."""
+    response_format = _response_format(RegulationEnrichment)
+    return [
+        _request_line(
+            n,
+            {
+                "model": model,
+                "messages": enrich_messages(text),
+                "response_format": response_format,
+                "temperature": 0,
+                "max_tokens": ENRICH_MAX_TOKENS,
+            },
+        )
+        for n, text in enumerate(texts)
+    ]
+
+
+def _parse_lines(lines: list[str], response_model: type[BaseModel]):
+    """Yield (custom_id, parsed response) for each successful output line."""
+    for line in lines:
+        record = json.loads(line)
+        try:
+            body = record["response"]["body"]
+            content = body["choices"][0]["message"]["content"]
+            parsed = response_model.model_validate_json(content)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.error(f"Error in batch request {record['custom_id']}: {e}")
+            continue
+        yield int(record["custom_id"]), parsed
+
+
+def parse_batch_output(lines: list[str], groups: list[list[str]]) -> dict[str, dict]:
+    """
+    Return the classification of each text key found in a batch output file.
+
+    groups maps each request's custom_id (its position) to the cache keys
+    of the texts it classified. Failed requests and texts the model skipped
+    are left out, so the caller can classify them again.
+    """
+    results = {}
+    for custom_id, parsed in _parse_lines(lines, BatchRelevanceClassification):
+        keys = groups[custom_id]
+        for key, result in zip(keys, classify_results(parsed, len(keys))):
+            if result != CLASSIFY_FALLBACK:
+                results[key] = result
+    return results
+
+
+def parse_enrich_output(lines: list[str], texts: list[str]) -> dict[str, dict]:
+    """Return the enrichment of each text found in a batch output file."""
+    return {
+        texts[custom_id]: enrichment_result(parsed)
+        for custom_id, parsed in _parse_lines(lines, RegulationEnrichment)
+    }
+
+
+def _cache_context(config: Config):
+    """Open the LLM cache when one is configured."""
+    return LLMCache(config.llm_cache_path) if config.llm_cache_path else nullcontext()
+
+
+def _submit(client: OpenAI, directory: Path, requests: list[dict]) -> str:
+    """Write requests as the batch input file, upload it and start the batch."""
+    input_path = directory / INPUT_FILE
+    input_path.write_text(
+        "".join(json.dumps(request, ensure_ascii=False) + "\n" for request in requests),
+        encoding="utf-8",
+    )
+    with input_path.open("rb") as f:
+        upload = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=upload.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(requests)} requests")
+    return batch.id
+
+
+def _download(client: OpenAI, batch_id: str, directory: Path) -> list[str] | None:
+    """
+    Return the output lines of a finished batch, or None while it runs.
+
+    A batch that failed, expired or was cancelled yields no lines, so the
+    caller falls back to regular requests for all of its texts.
+    """
+    batch = client.batches.retrieve(batch_id)
+    if batch.status not in FINAL_STATUSES:
+        logger.info(f"Batch {batch.id} is still {batch.status}")
+        return None
+
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.error(f"Batch {batch.id} ended as {batch.status}")
+        return []
+
+    output = client.files.content(batch.output_file_id).text
+    (directory / OUTPUT_FILE).write_text(output, encoding="utf-8")
+    return output.splitlines()
+
+
+def _save_state(directory: Path, df: pd.DataFrame, state: dict) -> None:
+    """Persist the rows and request layout of the pending batch."""
+    df.to_parquet(directory / REGULATIONS_FILE)
+    (directory / STATE_FILE).write_text(json.dumps(state), encoding="utf-8")
+
+
+def submit_classification_batch(
+    df: pd.DataFrame, config: Config, run_id: str | None = None
+) -> str | None:
+    """
+    Submit the classification of df as an OpenAI batch and save it as pending.
+
+    Prefilters and cache lookups run immediately; only the remaining texts
+    are uploaded, in groups of classification_batch_size per request. The
+    regulations and the request layout are written to a new run directory
+    under batch_dir, so collect_classification_batch can finish the run from
+    another process while earlier runs are still pending.
+
+    Returns:
+        The batch id, or None when every text was already answered locally
+    """
+    run_id = run_id or new_run_id()
+    directory = batch_dir(config) / run_id
+    directory.mkdir(parents=True)
+
+    client = get_client(
+        config.openai_api_key, config.llm_max_retries, config.llm_timeout
+    )
+    model = config.classification_model
+
+    with _cache_context(config) as cache:
+        candidates = select_candidates(df, config, client, cache)
+        pending = {}
+        for text, keep in zip(df["Texto"], candidates):
+            key = make_key("classify", model, text)
+            if not keep or key in pending:
+                continue
+            if cache is None or cache.get(key) is None:
+                pending[key] = text
+
+    size = config.classification_batch_size
+    keys = list(pending)
+    key_groups = [keys[i : i + size] for i in range(0, len(keys), size)]
+
+    batch_id = None
+    if key_groups:
+        requests = build_batch_requests(
+            [[pending[key] for key in group] for group in key_groups], model
+        )
+        batch_id = _submit(client, directory, requests)
+        logger.info(f"Batch {batch_id} classifies {len(keys)} texts")
+    else:
+        logger.info("Every text was answered locally, no batch submitted")
+
+    state = {
+        "stage": "classify",
+        "batch_id": batch_id,
+        "model": model,
+        "candidates": candidates.tolist(),
+        "groups": key_groups,
+    }
+    _save_state(directory, df, state)
+    return batch_id
+
+
+def collect_classification_batch(
+    config: Config, run_id: str | None = None
+) -> pd.DataFrame | None:
+    """
+    Advance a pending batch run: classify, filter and enrich its regulations.
+
+    Classification results lead to a second batch that enriches the
+    relevant regulations, unless their enrichment is already cached. Texts
+    a batch did not answer, or all of them when a batch failed or expired,
+    go through regular requests instead.
+
+    Args:
+        config: Application configuration
+        run_id: Run to advance, or None for the oldest pending run
+
+    Returns:
+        The relevant regulations, as classify_regulations returns them, or
+        None while a batch is still running. A finished run stays pending
+        until discard_batch_run, so a failed save can collect it again.
+    """
+    if run_id is None:
+        runs = pending_runs(config)
+        run_id = runs[0] if runs else ""
+    directory = batch_dir(config) / run_id
+    state_path = directory / STATE_FILE
+    if not run_id or not state_path.exists():
+        logger.warning("No pending batch to collect")
+        return pd.DataFrame()
+
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    client = get_client(
+        config.openai_api_key, config.llm_max_retries, config.llm_timeout
+    )
+
+    lines = []
+    if state["batch_id"] is not None:
+        lines = _download(client, state["batch_id"], directory)
+        if lines is None:
+            return None
+
+    df = pd.read_parquet(directory / REGULATIONS_FILE)
+    with _cache_context(config) as cache:
+        if state["stage"] == "classify":
+            relevant = _collect_classification(
+                df, state, lines, config, client, cache, directory
+            )
+        else:
+            relevant = _collect_enrichment(
+                df, state, lines, config.llm_max_workers, client, cache
+            )
+    return relevant
+
+
+def _collect_classification(
+    df: pd.DataFrame,
+    state: dict,
+    lines: list[str],
+    config: Config,
+    client: OpenAI,
+    cache: LLMCache | None,
+    directory: Path,
+) -> pd.DataFrame | None:
+    """Classify df from batch output, then enrich or submit the enrichment batch."""
+    model = state["model"]
+    candidates = np.asarray(state["candidates"], dtype=bool)
+    results = parse_batch_output(lines, state["groups"])
+    if cache is not None:
+        for key, result in results.items():
+            cache.set(key, result)
+
+    # Anything the batch did not answer goes through the regular path,
+    # which also serves the texts that were cached at submit time
+    texts = [text for text, keep in zip(df["Texto"], candidates) if keep]
+    keys = [make_key("classify", model, text) for text in texts]
+    missing = {}
+    for text, key in zip(texts, keys):
+        if key not in results:
+            missing.setdefault(key, text)
+    if missing:
+        logger.info(f"Classifying {len(missing)} texts without a batch result")
+    missing_results = classify_texts(
+        client,
+        list(missing.values()),
+        model,
+        batch_size=config.classification_batch_size,
+        max_workers=config.llm_max_workers,
+        cache=cache,
+    )
+    results.update(zip(missing, missing_results))
+
+    relevant = select_relevant(
+        df, candidates, [dict(results[key]) for key in keys], config
+    )
+    if relevant.empty:
+        return relevant
+
+    unique = list(dict.fromkeys(relevant["Texto"]))
+    pending = [
+        text
+        for text in unique
+        if cache is None or cache.get(make_key("enrich", model, text)) is None
+    ]
+    state = {"stage": "enrich", "batch_id": None, "model": model, "texts": pending}
+    if not pending:
+        return _collect_enrichment(
+            relevant, state, [], config.llm_max_workers, client, cache
+        )
+
+    state["batch_id"] = _submit(
+        client, directory, build_enrich_requests(pending, model)
+    )
+    logger.info(f"Batch {state['batch_id']} enriches {len(pending)} texts")
+    _save_state(directory, relevant, state)
+    return None
+
+
+def _collect_enrichment(
+    relevant: pd.DataFrame,
+    state: dict,
+    lines: list[str],
+    max_workers: int,
+    client: OpenAI,
+    cache: LLMCache | None,
+) -> pd.DataFrame:
+    """Enrich the relevant rows from batch output, requesting whatever is missing."""
+    model = state["model"]
+    results = parse_enrich_output(lines, state["texts"])
+    if cache is not None:
+        for text, result in results.items():
+            cache.set(make_key("enrich", model, text), result)
+
+    # Texts cached at submit time, or left unanswered, are enriched directly
+    missing = [text for text in dict.fromkeys(relevant["Texto"]) if text not in results]
+    results.update(
+        zip(
+            missing,
+            enrich_texts(
+                client, missing, model, max_workers=max_workers, cache=cache
+            ),
+        )
+    )
+    relevant = join_enrichment(relevant, results)
+    logger.info(f"Processed {len(relevant)} relevant regulations")
+    return relevant
+
+
+def classify_regulations_batch(
+    df: pd.DataFrame,
+    config: Config,
+    run_id: str,
+    poll_seconds: float = BATCH_POLL_SECONDS,
+) -> pd.DataFrame:
+    """
+    Classify, filter and enrich regulations through the Batch API.
+
+    Same result as classify_regulations, at the batch discount, but this
+    blocks until OpenAI completes the classification batch and then the
+    enrichment batch, each of which may take up to 24 hours. The run is
+    kept under run_id until the caller saves the result and discards it.
+    """
+    if df.empty:
+        logger.warning("Empty DataFrame received, nothing to classify")
+        return df
+
+    submit_classification_batch(df, config, run_id)
+    while (relevant := collect_classification_batch(config, run_id)) is None:
+        time.sleep(poll_seconds)
+    return relevant
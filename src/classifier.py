@@ -1,108 +1,327 @@
 """OpenAI-powered classification and summarization for regulations."""
 
+from __future__ import annotations
+
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
-from openai import OpenAI
 
 from src.config import Config
-from src.models import RelevanceClassification, TextSummary, TitleGeneration
-
-logger = logging.getLogger(__name__)
-
-
-def classify_text(client: OpenAI, text: str, model: str) -> dict:
-    """Classify text relevance for agricultural production."""
-    prompt = f"""
-    Rank the following text from 0 to 100 based on how relevant it is to agricultural production.
+from src.llm import get_client
+from src.llm_cache import LLMCache, cached, make_key
+from src.models import BatchRelevanceClassification, RegulationEnrichment
 
-    Espartina is a company dedicated to traditional crop production throughout Argentina's agricultural region.
-    You will classify texts corresponding to resolutions published in the Official Gazette of the Argentine Republic.
+if TYPE_CHECKING:
+    from openai import OpenAI
 
-    Consider as "Relevant" (100 points) only those resolutions that establish norms, requirements, regulations
-    or measures that directly and significantly impact agricultural production, transport, commercialization or financing.
-    This includes state provisions on seeds, agrochemicals, grains, merchandise transport, exports, imports,
-    rural contracts, reference prices, taxes, or environmental and labor aspects that may directly or indirectly
-    affect agricultural activity.
-
-    Give maximum score (100) only if the resolution has high economic impact and is highly relevant for a company
-    that mainly produces: wheat, soy, corn, popcorn corn, sunflower, sorghum, barley, sesame, carinata, beans,
-    chickpeas and peas.
+logger = logging.getLogger(__name__)
 
-    Assign 0 points if the resolution deals with Micro, Small and Medium Enterprises (MSMEs), or if it's not
-    related to agricultural production, or if it refers to general policies that don't concretely affect
-    the activity of an agricultural company.
+# Values returned when a call fails; these are never cached
+CLASSIFY_FALLBACK = {"relevance_score": 0, "reasoning": "Error in processing"}
+ENRICH_FALLBACK = {
+    "summary": "Error en resumen",
+    "key_points": [],
+    "title": "Título no disponible",
+    "category": "Sin categoría",
+}
+
+# Short descriptions of relevant regulations, compared against each text by
+# the optional embedding prefilter
+RELEVANCE_PROTOTYPES = [
+    "Resolución sobre exportación e importación de granos, cereales y oleaginosas",
+    "Normativa sobre semillas, agroquímicos y control fitosanitario",
+    "Derechos de exportación, retenciones e impuestos al sector agropecuario",
+    "Transporte de granos y mercaderías agrícolas",
+    "Precios de referencia y comercialización de trigo, soja, maíz y girasol",
+    "Contratos rurales, arrendamientos y financiamiento agropecuario",
+]
+
+# Word stems for the optional keyword prefilter: texts that match a negative
+# stem and no positive one are discarded without calling the LLM
+POSITIVE_KEYWORDS_RE = re.compile(
+    r"\b(?:trigo|soja|ma[ií]z|girasol|cebada|sorgo|granos?\b|cereal|oleaginos"
+    r"|agropecuari|agr[ií]col|agroindustri|agroqu[ií]mic|ganad|export|importaci"
+    r"|importador|retenciones|senasa|inase|fitosanitari|semilla|fertilizante|cosecha"
+    r"|siembra|rural|arrendamiento)",
+    re.IGNORECASE,
+)
+NEGATIVE_KEYWORDS_RE = re.compile(
+    r"\b(?:mipyme|turismo|tur[ií]stic|deport|cultura|museo|teatro|cinematogr"
+    r"|universidad|jubilaci|previsional)",
+    re.IGNORECASE,
+)
+PREFILTER_RESULT = {"relevance_score": 0, "reasoning": "Descartado por prefiltro"}
+
+# Character caps on the text sent to the models (roughly 4 characters per
+# token); the opening articles carry the information needed for relevance,
+# while summaries get more of the body to draw their key points from
+CLASSIFY_MAX_CHARS = 4000
+ENRICH_MAX_CHARS = 12000
+EMBEDDING_MAX_CHARS = 16000
+EMBEDDING_BATCH_SIZE = 64
+
+# Output token caps; structured responses are short, so a runaway generation
+# is cut off (and falls back) instead of holding a worker until it finishes
+CLASSIFY_MAX_TOKENS_PER_TEXT = 200
+ENRICH_MAX_TOKENS = 750
+
+# Output columns for each field returned by the LLM functions
+CLASSIFY_COLUMNS = {"relevance_score": "Relevancia", "reasoning": "Razonamiento"}
+ENRICH_COLUMNS = {
+    "summary": "Resumen",
+    "key_points": "Puntos_Clave",
+    "title": "Titulo_Generado",
+    "category": "Categoria",
+}
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at a word boundary when possible."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    head, _, _ = cut.rpartition(" ")
+    return head or cut
+
+
+def _map_concurrent(fn, items: list, max_workers: int) -> list:
+    """Apply fn to each item concurrently, preserving input order."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fn, items))
+
+
+# Static instructions go in the system message so every request shares the
+# same prefix, which the API can cache; only the texts vary per request
+CLASSIFY_SYSTEM = """
+Rank each of the following texts from 0 to 100 based on how relevant it is to agricultural production.
+
+Espartina is a company dedicated to traditional crop production throughout Argentina's agricultural region.
+You will classify texts corresponding to resolutions published in the Official Gazette of the Argentine Republic.
+
+Consider as "Relevant" (100 points) only those resolutions that establish norms, requirements, regulations
+or measures that directly and significantly impact agricultural production, transport, commercialization or financing.
+This includes state provisions on seeds, agrochemicals, grains, merchandise transport, exports, imports,
+rural contracts, reference prices, taxes, or environmental and labor aspects that may directly or indirectly
+affect agricultural activity.
+
+Give maximum score (100) only if the resolution has high economic impact and is highly relevant for a company
+that mainly produces: wheat, soy, corn, popcorn corn, sunflower, sorghum, barley, sesame, carinata, beans,
+chickpeas and peas.
+
+Assign 0 points if the resolution deals with Micro, Small and Medium Enterprises (MSMEs), or if it's not
+related to agricultural production, or if it refers to general policies that don't concretely affect
+the activity of an agricultural company.
+
+Be strict: only assign high values to resolutions that can really modify operations, costs, income,
+regulation or business context of an agricultural company like Espartina.
+
+Classify every text independently and return exactly one result per text, with `index` set to its number.
+""".strip()
+
+ENRICH_SYSTEM = """
+Summarize the regulatory text given by the user in Spanish, focusing on key aspects relevant to agricultural production.
+Provide a concise summary and identify the main points.
+
+Also create a meaningful title and categorize the text in Spanish.
+The title should be descriptive and indicate the main topic of the regulation.
+""".strip()
+
+
+def classify_messages(texts: list[str]) -> list[dict]:
+    """Build the chat messages that classify several texts in one request."""
+    numbered = "\n\n".join(
+        f"Text {i}: {_truncate(text, CLASSIFY_MAX_CHARS)}"
+        for i, text in enumerate(texts, start=1)
+    )
+    return [
+        {"role": "system", "content": CLASSIFY_SYSTEM},
+        {"role": "user", "content": numbered},
+    ]
+
+
+def classify_results(
+    parsed: BatchRelevanceClassification | None, count: int
+) -> list[dict]:
+    """Return one result per text from a parsed response, in input order."""
+    by_index = {item.index: item for item in parsed.results} if parsed else {}
+
+    missing = set(range(1, count + 1)) - by_index.keys()
+    if by_index and missing:
+        logger.warning(
+            f"Classification batch returned no result for texts {sorted(missing)}"
+        )
 
-    Be strict: only assign high values to resolutions that can really modify operations, costs, income,
-    regulation or business context of an agricultural company like Espartina.
+    results = []
+    for i in range(1, count + 1):
+        item = by_index.get(i)
+        if item is None:
+            results.append(dict(CLASSIFY_FALLBACK))
+        else:
+            results.append(
+                {"relevance_score": item.relevance_score, "reasoning": item.reasoning}
+            )
+    return results
 
-    Text: {text}
-    """
 
+def classify_batch(client: OpenAI, texts: list[str], model: str) -> list[dict]:
+    """Classify relevance of several texts with a single request, in input order."""
     try:
         response = client.beta.chat.completions.parse(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format=RelevanceClassification,
+            messages=classify_messages(texts),
+            response_format=BatchRelevanceClassification,
             temperature=0,
+            max_tokens=CLASSIFY_MAX_TOKENS_PER_TEXT * len(texts),
         )
-
-        result = response.choices[0].message.parsed
-        return {
-            "relevance_score": result.relevance_score,
-            "reasoning": result.reasoning,
-        }
+        parsed = response.choices[0].message.parsed
     except Exception as e:
         logger.error(f"Error in classification: {e}")
-        return {"relevance_score": 0, "reasoning": "Error in processing"}
+        parsed = None
 
+    return classify_results(parsed, len(texts))
 
-def summarize_text(client: OpenAI, text: str, model: str) -> dict:
-    """Summarize regulatory text."""
-    prompt = f"""
-    Summarize the following regulatory text in Spanish, focusing on key aspects relevant to agricultural production.
-    Provide a concise summary and identify the main points.
 
-    Text: {text}
+def classify_texts(
+    client: OpenAI,
+    texts: list[str],
+    model: str,
+    batch_size: int,
+    max_workers: int,
+    cache: LLMCache | None = None,
+) -> list[dict]:
     """
+    Classify texts in batches of batch_size, in input order.
+
+    Texts that only differ in whitespace are classified once and texts
+    already present in the cache are not sent again; batches are
+    dispatched concurrently.
+    """
+    text_keys = [make_key("classify", model, text) for text in texts]
+    first_text = {}
+    for key, text in zip(text_keys, texts):
+        first_text.setdefault(key, text)
+    keys, unique = list(first_text), list(first_text.values())
+    results = [cache.get(key) if cache else None for key in keys]
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+    batch_results = _map_concurrent(
+        lambda batch: classify_batch(client, [unique[i] for i in batch], model),
+        batches,
+        max_workers,
+    )
+
+    for batch, batch_result in zip(batches, batch_results):
+        for i, result in zip(batch, batch_result):
+            results[i] = result
+            if cache is not None and result != CLASSIFY_FALLBACK:
+                cache.set(keys[i], result)
+
+    by_key = dict(zip(keys, results))
+    return [dict(by_key[key]) for key in text_keys]
+
+
+def enrich_messages(text: str) -> list[dict]:
+    """Build the chat messages that summarize, title and categorize a text."""
+    return [
+        {"role": "system", "content": ENRICH_SYSTEM},
+        {"role": "user", "content": f"Text: {_truncate(text, ENRICH_MAX_CHARS)}"},
+    ]
 
+
+def enrichment_result(parsed: RegulationEnrichment) -> dict:
+    """Return the fields of a parsed enrichment response as a plain dict."""
+    return {
+        "summary": parsed.summary,
+        "key_points": parsed.key_points,
+        "title": parsed.title,
+        "category": parsed.category,
+    }
+
+
+@cached("enrich", ENRICH_FALLBACK)
+def enrich_text(client: OpenAI, text: str, model: str) -> dict:
+    """Summarize, title and categorize regulatory text in a single request."""
     try:
         response = client.beta.chat.completions.parse(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format=TextSummary,
+            messages=enrich_messages(text),
+            response_format=RegulationEnrichment,
             temperature=0,
+            max_tokens=ENRICH_MAX_TOKENS,
         )
-
-        result = response.choices[0].message.parsed
-        return {"summary": result.summary, "key_points": result.key_points}
+        return enrichment_result(response.choices[0].message.parsed)
     except Exception as e:
-        logger.error(f"Error in summarization: {e}")
-        return {"summary": "Error en resumen", "key_points": []}
+        logger.error(f"Error in enrichment: {e}")
+        return dict(ENRICH_FALLBACK)
+
+
+def enrich_texts(
+    client: OpenAI,
+    texts: list[str],
+    model: str,
+    max_workers: int,
+    cache: LLMCache | None = None,
+) -> list[dict]:
+    """Enrich texts concurrently, in input order, sending each distinct text once."""
+    unique = list(dict.fromkeys(texts))
+    results = _map_concurrent(
+        lambda text: enrich_text(client, text, model, cache=cache),
+        unique,
+        max_workers,
+    )
+    by_text = dict(zip(unique, results))
+    return [by_text[text] for text in texts]
 
 
-def create_title(client: OpenAI, text: str, model: str) -> dict:
-    """Generate a title and category for regulatory text."""
-    prompt = f"""
-    Create a meaningful title and categorize the following regulatory text in Spanish.
-    The title should be descriptive and indicate the main topic of the regulation.
+def keyword_candidates(texts: pd.Series, require_positive: bool = False) -> np.ndarray:
+    """
+    Return a mask of texts not ruled out by the keyword lists.
 
-    Text: {text}
+    By default only texts with a negative and no positive match are ruled
+    out; with require_positive, every text without a positive match is.
     """
+    positive = texts.str.contains(POSITIVE_KEYWORDS_RE, regex=True, na=False)
+    if require_positive:
+        return positive.to_numpy()
+    negative = texts.str.contains(NEGATIVE_KEYWORDS_RE, regex=True, na=False)
+    return (~negative | positive).to_numpy()
+
+
+def embed_texts(
+    client: OpenAI, texts: list[str], model: str, max_workers: int = 1
+) -> np.ndarray:
+    """Return L2-normalized embeddings for texts, one row per text."""
+    batches = [
+        [
+            _truncate(text, EMBEDDING_MAX_CHARS)
+            for text in texts[start : start + EMBEDDING_BATCH_SIZE]
+        ]
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+    responses = _map_concurrent(
+        lambda batch: client.embeddings.create(model=model, input=batch),
+        batches,
+        max_workers,
+    )
+    vectors = [item.embedding for response in responses for item in response.data]
 
-    try:
-        response = client.beta.chat.completions.parse(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format=TitleGeneration,
-            temperature=0,
-        )
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
 
-        result = response.choices[0].message.parsed
-        return {"title": result.title, "category": result.category}
-    except Exception as e:
-        logger.error(f"Error in title generation: {e}")
-        return {"title": "Título no disponible", "category": "Sin categoría"}
+
+def prototype_similarity(
+    client: OpenAI, texts: list[str], model: str, max_workers: int = 1
+) -> np.ndarray:
+    """Return each text's highest cosine similarity to RELEVANCE_PROTOTYPES."""
+    vectors = embed_texts(client, texts + RELEVANCE_PROTOTYPES, model, max_workers)
+    docs, prototypes = vectors[: len(texts)], vectors[len(texts) :]
+    return (docs @ prototypes.T).max(axis=1)
 
 
 def classify_regulations(df: pd.DataFrame, config: Config) -> pd.DataFrame:
@@ -121,17 +340,137 @@ def classify_regulations(df: pd.DataFrame, config: Config) -> pd.DataFrame:
         logger.warning("Empty DataFrame received, nothing to classify")
         return df
 
-    client = OpenAI(api_key=config.openai_api_key)
-    model = config.classification_model
+    # The client retries rate-limited (429) and transient errors with backoff
+    client = get_client(
+        config.openai_api_key, config.llm_max_retries, config.llm_timeout
+    )
+
+    # Results are cached on disk so unchanged texts are never re-sent
+    cache_context = (
+        LLMCache(config.llm_cache_path) if config.llm_cache_path else nullcontext()
+    )
+    with cache_context as cache:
+        return _classify_and_enrich(df, config, client, cache)
 
+
+def _classify_and_enrich(
+    df: pd.DataFrame, config: Config, client: OpenAI, cache: LLMCache | None
+) -> pd.DataFrame:
+    """Run the classification and enrichment stages of classify_regulations."""
     logger.info(f"Classifying {len(df)} regulations...")
 
-    # Apply classification
-    classification_results = df["Texto"].apply(
-        lambda x: classify_text(client, x, model)
+    candidates = select_candidates(df, config, client, cache)
+    candidate_results = classify_texts(
+        client,
+        [text for text, keep in zip(df["Texto"], candidates) if keep],
+        config.classification_model,
+        batch_size=config.classification_batch_size,
+        max_workers=config.llm_max_workers,
+        cache=cache,
+    )
+    return enrich_relevant(df, candidates, candidate_results, config, client, cache)
+
+
+def select_candidates(
+    df: pd.DataFrame, config: Config, client: OpenAI, cache: LLMCache | None
+) -> np.ndarray:
+    """Return a mask of the texts that the enabled prefilters send to the LLM."""
+    model = config.classification_model
+    texts = df["Texto"].tolist()
+    candidates = np.ones(len(texts), dtype=bool)
+
+    # Cheap keyword rules run first, so obviously unrelated texts are not
+    # embedded or classified
+    if config.keyword_prefilter:
+        candidates = keyword_candidates(
+            df["Texto"], require_positive=config.keyword_require_positive
+        )
+        logger.info(
+            f"Keyword prefilter kept {candidates.sum()} of {len(texts)} texts"
+        )
+
+    # Texts that look nothing like a relevant regulation skip the LLM; texts
+    # scored on an earlier run are answered from the cache without embedding
+    if config.embedding_prefilter and candidates.any():
+        scored = np.zeros(len(texts), dtype=bool)
+        if cache is not None:
+            scored[:] = [
+                cache.get(make_key("classify", model, text)) is not None
+                for text in texts
+            ]
+        positions = np.flatnonzero(candidates & ~scored)
+        try:
+            if positions.size:
+                similarity = prototype_similarity(
+                    client,
+                    [texts[i] for i in positions],
+                    config.embedding_model,
+                    max_workers=config.llm_max_workers,
+                )
+                candidates[positions] = similarity >= config.embedding_min_similarity
+            logger.info(
+                f"Embedding prefilter kept {candidates.sum()} of {len(texts)} texts"
+            )
+        except Exception as e:
+            logger.warning(
+                f"Embedding prefilter failed, classifying remaining texts: {e}"
+            )
+
+    return candidates
+
+
+def enrich_relevant(
+    df: pd.DataFrame,
+    candidates: np.ndarray,
+    candidate_results: list[dict],
+    config: Config,
+    client: OpenAI,
+    cache: LLMCache | None,
+) -> pd.DataFrame:
+    """Join classification results to df, then keep and enrich the top rows."""
+    relevante_df = select_relevant(df, candidates, candidate_results, config)
+    if relevante_df.empty:
+        return relevante_df
+
+    logger.info(f"Found {len(relevante_df)} relevant regulations, enriching...")
+
+    # Summary and title come from one request per distinct text
+    texts = relevante_df["Texto"].tolist()
+    results = enrich_texts(
+        client,
+        texts,
+        config.classification_model,
+        max_workers=config.llm_max_workers,
+        cache=cache,
+    )
+    relevante_df = join_enrichment(relevante_df, dict(zip(texts, results)))
+
+    logger.info(f"Processed {len(relevante_df)} relevant regulations")
+
+    return relevante_df
+
+
+def select_relevant(
+    df: pd.DataFrame,
+    candidates: np.ndarray,
+    candidate_results: list[dict],
+    config: Config,
+) -> pd.DataFrame:
+    """
+    Join classification results to df and keep the top rows above the threshold.
+
+    candidate_results holds one result per True entry of candidates, in
+    order; rows ruled out by the prefilters get PREFILTER_RESULT.
+    """
+    results = iter(candidate_results)
+    classification_results = [
+        next(results) if keep else dict(PREFILTER_RESULT) for keep in candidates
+    ]
+    df = df.join(
+        pd.DataFrame(classification_results, index=df.index).rename(
+            columns=CLASSIFY_COLUMNS
+        )
     )
-    df["Relevancia"] = classification_results.apply(lambda x: x["relevance_score"])
-    df["Razonamiento"] = classification_results.apply(lambda x: x["reasoning"])
 
     # Filter by relevance threshold
     relevante_df = (
@@ -145,26 +484,16 @@ def classify_regulations(df: pd.DataFrame, config: Config) -> pd.DataFrame:
         logger.info(
             f"No regulations found with relevance > {config.relevance_threshold}"
         )
-        return relevante_df
-
-    logger.info(f"Found {len(relevante_df)} relevant regulations, enriching...")
+    return relevante_df
 
-    # Apply summarization
-    summary_results = relevante_df["Texto"].apply(
-        lambda x: summarize_text(client, x, model)
-    )
-    relevante_df["Resumen"] = summary_results.apply(lambda x: x["summary"])
-    relevante_df["Puntos_Clave"] = summary_results.apply(
-        lambda x: "; ".join(x["key_points"])
-    )
 
-    # Apply title generation
-    title_results = relevante_df["Texto"].apply(
-        lambda x: create_title(client, x, model)
+def join_enrichment(relevante_df: pd.DataFrame, by_text: dict) -> pd.DataFrame:
+    """Add the enrichment columns to relevant rows from results keyed by text."""
+    enrich_results = [by_text[text] for text in relevante_df["Texto"]]
+    relevante_df = relevante_df.join(
+        pd.DataFrame(enrich_results, index=relevante_df.index).rename(
+            columns=ENRICH_COLUMNS
+        )
     )
-    relevante_df["Titulo_Generado"] = title_results.apply(lambda x: x["title"])
-    relevante_df["Categoria"] = title_results.apply(lambda x: x["category"])
-
-    logger.info(f"Processed {len(relevante_df)} relevant regulations")
-
+    relevante_df["Puntos_Clave"] = relevante_df["Puntos_Clave"].str.join("; ")
     return relevante_df
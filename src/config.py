@@ -3,10 +3,15 @@
 import logging
 import os
 from dataclasses import dataclass
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+# Size at which a log file is rotated, and how many rotated files are kept
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUP_COUNT = 5
+
 
 @dataclass
 class Config:
@@ -23,7 +28,22 @@ class Config:
     openai_api_key: str
     classification_model: str = "gpt-4o-2024-08-06"
     summary_model: str = "gpt-4o-mini"
+    skip_llm_summary: bool = False
     relevance_threshold: int = 70
+    classification_batch_size: int = 10
+    keyword_prefilter: bool = False
+    keyword_require_positive: bool = False
+    embedding_model: str = "text-embedding-3-small"
+    embedding_prefilter: bool = False
+    embedding_min_similarity: float = 0.3
+    llm_max_workers: int = 8
+    llm_max_retries: int = 5
+    llm_timeout: float = 60.0
+    llm_cache_path: Path | None = None
+    use_batch_api: bool = False
+
+    # Storage
+    export_excel: bool = True
 
     # Email
     email_from: str = ""
@@ -31,6 +51,7 @@ class Config:
     email_password: str = ""
     smtp_server: str = "smtp-mail.outlook.com"
     smtp_port: int = 587
+    email_per_recipient: bool = False
 
     # Mode
     test_mode: bool = False
@@ -57,6 +78,12 @@ def load_config() -> Config:
     test_mode_env = os.getenv("TEST_MODE", "false").lower()
     test_mode = test_mode_env in ("true", "1", "yes")
 
+    batch_env = os.getenv("USE_BATCH_API", "false").lower()
+    use_batch_api = batch_env in ("true", "1", "yes")
+
+    export_env = os.getenv("EXPORT_EXCEL", "true").lower()
+    export_excel = export_env in ("true", "1", "yes")
+
     return Config(
         project_dir=project_dir,
         output_dir=output_dir,
@@ -64,24 +91,39 @@ def load_config() -> Config:
         log_dir=log_dir,
         excel_path=data_dir / "resoluciones_relevantes.xlsx",
         openai_api_key=openai_api_key,
+        llm_cache_path=data_dir / "llm_cache.sqlite",
         email_from=os.getenv("EMAIL_FROM", ""),
         email_to=os.getenv("EMAIL_TO", ""),
         email_password=os.getenv("EMAIL_PASSWORD", ""),
+        use_batch_api=use_batch_api,
+        export_excel=export_excel,
         test_mode=test_mode,
     )
 
 
 def setup_logging(name: str, log_dir: Path) -> logging.Logger:
-    """Set up logging to both file and console."""
+    """
+    Set up logging to both file and console.
+
+    Handlers are only added on the first call for a given name, so repeated
+    calls (e.g. one per Prefect task run) reuse them. The log file rotates
+    by size and is not opened until the first record is written.
+    """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    if logger.handlers:
+        return logger
 
-    # Clear existing handlers
-    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
 
     # File handler
     log_file = log_dir / f"{name}.log"
-    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
     file_handler.setLevel(logging.INFO)
     file_format = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
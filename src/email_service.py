@@ -1,17 +1,123 @@
 """Email generation and sending service."""
 
+from __future__ import annotations
+
+import html
 import logging
 import smtplib
-from datetime import datetime
+from datetime import date, datetime
 from email.message import EmailMessage
+from functools import partial
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 
 import pandas as pd
-from openai import OpenAI
 
 from src.config import Config
+from src.llm import get_client
+from src.models import ResumenEjecutivo
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 logger = logging.getLogger(__name__)
 
+EMAIL_HEADER = """
+    <div style="font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto;">
+        <h1 style="color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;">
+            Resoluciones del Boletín Oficial de la Última Semana
+        </h1>
+    """
+
+REGULATION_BLOCK = """
+        <div style="margin-bottom: 30px; padding: 20px; border: 1px solid #ecf0f1; border-radius: 5px;">
+            <h2 style="color: #34495e; margin-top: 0; margin-bottom: 15px; font-size: 18px;">
+                {titulo} - {fecha}
+            </h2>
+            <p style="color: #555; line-height: 1.6; margin-bottom: 15px;">
+                {resumen}
+            </p>
+            <p style="margin-bottom: 0;">
+                <a href="{enlace}" style="color: #3498db; text-decoration: none; font-weight: bold;">
+                    Ver resolución completa
+                </a>
+            </p>
+        </div>
+        """
+
+EMAIL_FOOTER = "</div>"
+
+BLOCK_COLUMNS = ["Titulo_Generado", "Fecha Publicación", "Resumen", "Enlace"]
+# Every stored column the weekly report reads
+REPORT_COLUMNS = [*BLOCK_COLUMNS, "Relevancia"]
+
+SUMMARY_ITEM = (
+    '<li style="margin-bottom:6px;"><a href="{enlace}" style="text-decoration:none;'
+    ' font-weight:600; color:#1b73c4;">{titulo}</a> — {fecha}</li>'
+)
+ITEM_COLUMNS = ["Titulo_Generado", "Fecha Publicación", "Enlace"]
+
+# Box around the executive summary, whether written by the LLM or the fallback
+SUMMARY_WRAPPER = """
+    <div style="background:#f7fbff; border:1px solid #d6e9ff; padding:16px; border-radius:8px; margin:16px 0 24px 0;">
+        <h2 style="margin:0 0 8px 0; color:#1f3b57; font-size:18px;">Resumen ejecutivo</h2>
+        {content}
+    </div>
+    """.strip()
+
+# Paragraph and top-regulation list inside the box; the paragraph is written
+# by the LLM when available, the list is always rendered here
+SUMMARY_CONTENT = """
+    <p style="margin:0 0 12px 0; line-height:1.6; color:#34495e;">
+        {paragraph}
+    </p>
+    <ol style="margin:0; padding-left:20px;">
+        {items}
+    </ol>
+    """.strip()
+
+FALLBACK_PARAGRAPH = (
+    "Este informe reúne {total} resoluciones relevantes de {period_label}. "
+    "A continuación, las {count} de mayor importancia:"
+)
+
+
+def _enlace_seguro(enlace: str) -> str:
+    """Return the escaped link if it is http(s), or "#" otherwise."""
+    if urlsplit(str(enlace)).scheme not in ("http", "https"):
+        return "#"
+    return html.escape(str(enlace))
+
+
+def _formatear_fecha(fecha) -> str:
+    """Return a stored publication date as dd/mm/YYYY text."""
+    if isinstance(fecha, date) and pd.notna(fecha):
+        return fecha.strftime("%d/%m/%Y")
+    return str(fecha)
+
+
+def _escapar(columna: str, valor) -> str:
+    """Render one cell for HTML: links are vetted, everything else is escaped."""
+    if columna == "Enlace":
+        return _enlace_seguro(valor)
+    if columna == "Titulo_Generado":
+        valor = valor or "(Sin título)"
+    elif columna == "Fecha Publicación":
+        valor = _formatear_fecha(valor)
+    return html.escape(str(valor))
+
+
+def _filas_html(df: pd.DataFrame, columns: list[str]) -> list[dict]:
+    """
+    Return the given columns of df as rows of HTML-safe values.
+
+    Every template value passes through here, so titles and summaries
+    written by the LLM are always escaped and missing cells render empty.
+    """
+    values = df.reindex(columns=columns).fillna("")
+    escaped = [values[column].map(partial(_escapar, column)) for column in columns]
+    return [dict(zip(columns, row)) for row in zip(*escaped)]
+
 
 def build_top_resolutions_payload(df: pd.DataFrame, top_n: int = 3) -> pd.DataFrame:
     """
@@ -21,53 +127,52 @@ def build_top_resolutions_payload(df: pd.DataFrame, top_n: int = 3) -> pd.DataFr
     if df is None or df.empty:
         return pd.DataFrame()
 
-    work_df = df.copy()
-    if "Relevancia" in work_df.columns:
-        work_df["Relevancia"] = pd.to_numeric(work_df["Relevancia"], errors="coerce")
-        work_df = work_df.sort_values(by="Relevancia", ascending=False, na_position="last")
+    columns = [c for c in REPORT_COLUMNS if c in df.columns]
+    if "Relevancia" not in df.columns:
+        return df.head(top_n)[columns].fillna("")
 
-    columns = ["Titulo_Generado", "Fecha Publicación", "Resumen", "Enlace"]
-    if "Relevancia" in work_df.columns:
-        columns.append("Relevancia")
+    # Rows are ranked by position, so only the top rows are ever copied
+    relevancia = pd.to_numeric(df["Relevancia"], errors="coerce").reset_index(drop=True)
+    order = relevancia.sort_values(ascending=False, na_position="last").index[:top_n]
+    top = df.iloc[order][columns].assign(Relevancia=relevancia[order].to_numpy())
+    return top.fillna("")
 
-    available_cols = [c for c in columns if c in work_df.columns]
-    return work_df.head(top_n)[available_cols].fillna("")
+
+def _resumen_html(top: pd.DataFrame, paragraph: str) -> str:
+    """Render the summary box with an escaped paragraph and the top regulations."""
+    items = [
+        SUMMARY_ITEM.format(
+            titulo=fila["Titulo_Generado"],
+            fecha=fila["Fecha Publicación"],
+            enlace=fila["Enlace"],
+        )
+        for fila in _filas_html(top, ITEM_COLUMNS)
+    ]
+    content = SUMMARY_CONTENT.format(
+        paragraph=html.escape(paragraph), items="".join(items)
+    )
+    return SUMMARY_WRAPPER.format(content=content)
 
 
 def generar_resumen_ejecutivo_fallback(
-    df: pd.DataFrame, period_label: str, top_n: int = 3
+    df: pd.DataFrame,
+    period_label: str,
+    top_n: int = 3,
+    top: pd.DataFrame | None = None,
 ) -> str:
-    """Simple local fallback if LLM is unavailable."""
+    """
+    Simple local fallback if LLM is unavailable.
+    ``top`` reuses rows already built by build_top_resolutions_payload.
+    """
     if df is None or df.empty:
         return ""
 
-    top = build_top_resolutions_payload(df, top_n=top_n)
-    total = len(df)
-
-    paragraph = f"""
-    <p style="margin:0 0 12px 0; line-height:1.6; color:#34495e;">
-        Este informe reúne {total} resoluciones relevantes de {period_label}. A continuación, las {min(top_n, len(top))} de mayor importancia:
-    </p>
-    """
-
-    items = []
-    for _, row in top.iterrows():
-        title = row.get("Titulo_Generado", "(Sin título)") or "(Sin título)"
-        date_ = row.get("Fecha Publicación", "")
-        link = row.get("Enlace", "#") or "#"
-        items.append(
-            f'<li style="margin-bottom:6px;"><a href="{link}" style="text-decoration:none; font-weight:600; color:#1b73c4;">{title}</a> — {date_}</li>'
-        )
-
-    return f"""
-    <div style="background:#f7fbff; border:1px solid #d6e9ff; padding:16px; border-radius:8px; margin:16px 0 24px 0;">
-        <h2 style="margin:0 0 8px 0; color:#1f3b57; font-size:18px;">Resumen ejecutivo</h2>
-        {paragraph}
-        <ol style="margin:0; padding-left:20px;">
-            {''.join(items)}
-        </ol>
-    </div>
-    """.strip()
+    if top is None:
+        top = build_top_resolutions_payload(df, top_n=top_n)
+    paragraph = FALLBACK_PARAGRAPH.format(
+        total=len(df), period_label=period_label, count=min(top_n, len(top))
+    )
+    return _resumen_html(top, paragraph)
 
 
 def generar_resumen_ejecutivo_llm(
@@ -76,30 +181,46 @@ def generar_resumen_ejecutivo_llm(
     period_label: str = "la última semana",
     top_n: int = 3,
     model: str = "gpt-4o-mini",
-    max_tokens: int = 350,
+    max_tokens: int = 180,
     temperature: float = 0.2,
+    top: pd.DataFrame | None = None,
 ) -> str:
     """
-    Uses OpenAI to produce an executive summary in Spanish.
-    Returns an HTML snippet ready to inject into the email.
-    Falls back to a local summary on API/error.
+    Uses OpenAI to write the executive summary paragraph in Spanish.
+    Returns an HTML snippet ready to inject into the email; the model only
+    returns the paragraph text, and the HTML, including the list of top
+    regulations, is rendered locally.
+    Falls back to a local summary on API/error, reusing the same ``top`` rows.
     """
-    try:
-        if df is None or df.empty:
-            return ""
+    if df is None or df.empty:
+        return ""
 
+    if top is None:
         top = build_top_resolutions_payload(df, top_n=top_n)
+    if len(df) <= top_n:
+        # Every regulation is listed anyway; the paragraph adds nothing
+        return generar_resumen_ejecutivo_fallback(df, period_label, top_n, top=top)
+
+    try:
         total_count = len(df)
 
-        records = []
-        for _, row in top.iterrows():
-            records.append({
-                "title": str(row.get("Titulo_Generado", ""))[:220],
-                "date": str(row.get("Fecha Publicación", ""))[:20],
-                "summary": str(row.get("Resumen", ""))[:600],
-                "url": str(row.get("Enlace", ""))[:400],
-                "relevance": float(row.get("Relevancia", 0)) if "Relevancia" in row else None,
-            })
+        columns = top.reindex(columns=BLOCK_COLUMNS).fillna("")
+        relevances = (
+            top["Relevancia"].map(float)
+            if "Relevancia" in top.columns
+            else [None] * len(top)
+        )
+        records = [
+            {
+                "title": str(titulo)[:220],
+                "date": _formatear_fecha(fecha)[:20],
+                "summary": str(resumen)[:600],
+                "relevance": relevance,
+            }
+            for (titulo, fecha, resumen, _), relevance in zip(
+                zip(*(columns[column] for column in BLOCK_COLUMNS)), relevances
+            )
+        ]
 
         system_msg = (
             "Eres un asistente editorial que redacta resúmenes ejecutivos breves y claros para emails internos "
@@ -107,7 +228,7 @@ def generar_resumen_ejecutivo_llm(
         )
 
         user_msg = {
-            "task": "Escribir un resumen ejecutivo para un email en español.",
+            "task": "Escribir el párrafo de un resumen ejecutivo para un email en español.",
             "constraints": {
                 "paragraph_word_limit": 90,
                 "style": "claro, conciso, orientado a negocio",
@@ -119,16 +240,15 @@ def generar_resumen_ejecutivo_llm(
                 "top_items": records,
             },
             "output_spec": {
-                "format": "HTML",
+                "format": "Texto plano, sin HTML ni Markdown.",
                 "structure": [
-                    "Un párrafo único (<p>) que resuma el período y mencione que se listan las 3 más importantes.",
-                    "Una lista ordenada (<ol>) con hasta 3 <li>, cada uno con <a href='URL'>Título</a> — Fecha.",
+                    f"Un párrafo único que resuma el período y mencione que a continuación se listan las {len(top)} más importantes.",
                 ],
                 "tone": "profesional",
             },
         }
 
-        completion = client.chat.completions.create(
+        completion = client.beta.chat.completions.parse(
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
@@ -136,22 +256,18 @@ def generar_resumen_ejecutivo_llm(
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": f"INSTRUCCIONES:\n{user_msg}"},
             ],
+            response_format=ResumenEjecutivo,
         )
 
-        generated = completion.choices[0].message.content.strip()
-        if not generated:
-            return generar_resumen_ejecutivo_fallback(df, period_label=period_label, top_n=top_n)
+        paragraph = completion.choices[0].message.parsed.paragraph.strip()
+        if not paragraph:
+            return generar_resumen_ejecutivo_fallback(df, period_label, top_n, top=top)
 
-        return f"""
-        <div style="background:#f7fbff; border:1px solid #d6e9ff; padding:16px; border-radius:8px; margin:16px 0 24px 0;">
-            <h2 style="margin:0 0 8px 0; color:#1f3b57; font-size:18px;">Resumen ejecutivo</h2>
-            {generated}
-        </div>
-        """.strip()
+        return _resumen_html(top, paragraph)
 
     except Exception as exc:
         logger.warning(f"LLM summary failed, using fallback: {exc}")
-        return generar_resumen_ejecutivo_fallback(df, period_label=period_label, top_n=top_n)
+        return generar_resumen_ejecutivo_fallback(df, period_label, top_n, top=top)
 
 
 def generar_html_email_styled(
@@ -160,53 +276,43 @@ def generar_html_email_styled(
     period_label: str = "la última semana",
 ) -> str:
     """Generate styled HTML for an email with Official Bulletin resolutions."""
-    client = OpenAI(api_key=config.openai_api_key)
-
-    html_content = """
-    <div style="font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto;">
-        <h1 style="color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px;">
-            Resoluciones del Boletín Oficial de la Última Semana
-        </h1>
-    """
-
-    html_content += generar_resumen_ejecutivo_llm(
-        df=df,
-        client=client,
-        period_label=period_label,
-        top_n=3,
-        model=config.summary_model,
-        max_tokens=350,
-        temperature=0.2,
-    )
-
-    for _, row in df.iterrows():
-        fecha = row.get("Fecha Publicación", "")
-        titulo = row.get("Titulo_Generado", "(Sin título)") or "(Sin título)"
-        resumen = row.get("Resumen", "")
-        enlace = row.get("Enlace", "#") or "#"
+    top = build_top_resolutions_payload(df, top_n=3)
+    if config.skip_llm_summary or not config.summary_model:
+        resumen_ejecutivo = generar_resumen_ejecutivo_fallback(
+            df, period_label=period_label, top_n=3, top=top
+        )
+    else:
+        client = get_client(
+            config.openai_api_key, config.llm_max_retries, config.llm_timeout
+        )
+        resumen_ejecutivo = generar_resumen_ejecutivo_llm(
+            df=df,
+            client=client,
+            period_label=period_label,
+            top_n=3,
+            model=config.summary_model,
+            max_tokens=180,
+            temperature=0.2,
+            top=top,
+        )
 
-        html_content += f"""
-        <div style="margin-bottom: 30px; padding: 20px; border: 1px solid #ecf0f1; border-radius: 5px;">
-            <h2 style="color: #34495e; margin-top: 0; margin-bottom: 15px; font-size: 18px;">
-                {titulo} - {fecha}
-            </h2>
-            <p style="color: #555; line-height: 1.6; margin-bottom: 15px;">
-                {resumen}
-            </p>
-            <p style="margin-bottom: 0;">
-                <a href="{enlace}" style="color: #3498db; text-decoration: none; font-weight: bold;">
-                    Ver resolución completa
-                </a>
-            </p>
-        </div>
-        """
+    blocks = [
+        REGULATION_BLOCK.format(
+            titulo=fila["Titulo_Generado"],
+            fecha=fila["Fecha Publicación"],
+            resumen=fila["Resumen"],
+            enlace=fila["Enlace"],
+        )
+        for fila in _filas_html(df, BLOCK_COLUMNS)
+    ]
 
-    html_content += "</div>"
-    return html_content
+    return EMAIL_HEADER + resumen_ejecutivo + "".join(blocks) + EMAIL_FOOTER
 
 
-def enviar_email(recipient: str | list[str], body: str, config: Config) -> None:
-    """Send email via SMTP."""
+def crear_mensaje(
+    recipient: str | list[str], body: str, config: Config
+) -> EmailMessage:
+    """Build the weekly report message for recipient with an HTML body."""
     hoy = datetime.now().strftime("%d/%m/%Y")
 
     msg = EmailMessage()
@@ -220,15 +326,68 @@ def enviar_email(recipient: str | list[str], body: str, config: Config) -> None:
 
     msg.set_content("Este email requiere un cliente que soporte HTML.")
     msg.add_alternative(body, subtype="html")
+    return msg
+
+
+class EmailSender:
+    """
+    SMTP session that is opened and authenticated once for several messages.
+
+    STARTTLS and login happen on entering the context, so every message
+    sent inside it reuses the same connection instead of paying for a new
+    handshake each.
+    """
+
+    def __init__(self, config: Config):
+        self._config = config
+        self._smtp: smtplib.SMTP | None = None
+
+    def __enter__(self) -> "EmailSender":
+        smtp = smtplib.SMTP(self._config.smtp_server, self._config.smtp_port)
+        try:
+            smtp.starttls()
+            smtp.login(self._config.email_from, self._config.email_password)
+        except BaseException:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        smtp, self._smtp = self._smtp, None
+        # A broken connection must not replace the error raised while sending
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+    def send(self, msg: EmailMessage) -> None:
+        """Send msg over the open connection."""
+        if self._smtp is None:
+            raise RuntimeError("EmailSender must be used as a context manager")
+        self._smtp.send_message(msg)
+
+
+def enviar_email(recipient: str | list[str], body: str, config: Config) -> None:
+    """
+    Send email via SMTP.
+
+    With config.email_per_recipient, each address in a recipient list gets
+    its own message, so recipients do not see each other; all of them are
+    still sent over one connection.
+    """
+    if config.email_per_recipient and isinstance(recipient, list):
+        mensajes = [crear_mensaje(address, body, config) for address in recipient]
+    else:
+        mensajes = [crear_mensaje(recipient, body, config)]
 
     logger.info(f"Sending email to {recipient}")
 
     try:
-        with smtplib.SMTP(config.smtp_server, config.smtp_port) as smtp:
-            smtp.starttls()
-            smtp.login(config.email_from, config.email_password)
-            smtp.send_message(msg)
-        logger.info("Email sent successfully")
+        with EmailSender(config) as sender:
+            for msg in mensajes:
+                sender.send(msg)
+        logger.info(f"Email sent successfully ({len(mensajes)} messages)")
     except smtplib.SMTPAuthenticationError as e:
         logger.error(f"SMTP authentication failed: {e}")
         raise
@@ -0,0 +1,32 @@
+"""Shared OpenAI client for every LLM call in the process."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+@lru_cache(maxsize=None)
+def get_client(
+    api_key: str, max_retries: int = 2, timeout: float | None = None
+) -> OpenAI:
+    """
+    Return the OpenAI client for these settings, creating it on first use.
+
+    Classification, enrichment and the email summary all share one client,
+    and with it one HTTP connection pool, so TLS connections opened by one
+    stage are reused by the next instead of being set up again. The SDK is
+    imported here, on first use, since importing it takes hundreds of
+    milliseconds that runs without LLM calls should not pay.
+
+    timeout bounds each request in seconds; None keeps the SDK default of
+    ten minutes, long enough for one stalled call to hold a worker thread.
+    """
+    from openai import OpenAI
+
+    if timeout is None:
+        return OpenAI(api_key=api_key, max_retries=max_retries)
+    return OpenAI(api_key=api_key, max_retries=max_retries, timeout=timeout)
@@ -0,0 +1,125 @@
+"""Persistent cache for OpenAI responses keyed by the normalized input text."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever prompts or response models change so stale results are not served
+PROMPT_VERSION = "4"
+
+# Entries kept in memory in front of SQLite, most recently used last
+MEMORY_CACHE_SIZE = 1024
+
+
+def normalize_text(text: str) -> str:
+    """Canonicalize Unicode form and whitespace so re-scraped copies match."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_key(kind: str, model: str, text: str) -> str:
+    """Build the cache key for a given task, model and normalized input text."""
+    payload = "\x00".join((PROMPT_VERSION, kind, model, normalize_text(text)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed store of JSON-serializable LLM results, safe across threads.
+
+    Recently used entries are also kept in memory, as JSON, so repeated
+    lookups in a run skip the database while callers still get fresh dicts.
+    """
+
+    def __init__(self, path: Path, memory_size: int = MEMORY_CACHE_SIZE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_size = memory_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def _remember(self, key: str, value: str) -> None:
+        """Keep value in memory, evicting the least recently used entry."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._conn.execute(
+                    "SELECT value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value = row[0]
+                self._remember(key, value)
+        return json.loads(value)
+
+    def set(self, key: str, value: dict) -> None:
+        """Store value under key, replacing any previous entry."""
+        serialized = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)",
+                (key, serialized),
+            )
+            self._remember(key, serialized)
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "LLMCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def cached(kind: str, fallback: dict):
+    """
+    Cache results of an LLM function with signature fn(client, text, model).
+
+    The wrapped function accepts an optional ``cache`` keyword; when it is
+    None the call goes straight to the model. Results equal to ``fallback``
+    (the function's error value) are never stored.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(client, text: str, model: str, cache: LLMCache | None = None):
+            if cache is None:
+                return fn(client, text, model)
+
+            key = make_key(kind, model, text)
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+
+            result = fn(client, text, model)
+            if result != fallback:
+                cache.set(key, result)
+            return result
+
+        return wrapper
+
+    return decorator
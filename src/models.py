@@ -17,6 +17,20 @@ class RelevanceClassification(BaseModel):
     )
 
 
+class BatchRelevanceItem(RelevanceClassification):
+    """Relevance classification for one text within a batch."""
+
+    index: int = Field(..., description="Number of the text this result refers to")
+
+
+class BatchRelevanceClassification(BaseModel):
+    """Model for classifying several texts in a single request."""
+
+    results: list[BatchRelevanceItem] = Field(
+        ..., description="One classification per input text"
+    )
+
+
 class TextSummary(BaseModel):
     """Model for text summarization."""
 
@@ -38,3 +52,23 @@ class TitleGeneration(BaseModel):
         ...,
         description="Category or type of regulation (e.g., 'Exportación', 'Semillas', 'Impuestos')",
     )
+
+
+class RegulationEnrichment(TextSummary, TitleGeneration):
+    """
+    Model for summarizing and titling a text in a single request.
+
+    Relevance is deliberately not part of this model: every scraped text
+    is scored, several per request, while only the few above the threshold
+    are summarized, so merging both would generate summaries for texts
+    that are then discarded.
+    """
+
+
+class ResumenEjecutivo(BaseModel):
+    """Model for the executive summary paragraph of the weekly email."""
+
+    paragraph: str = Field(
+        ...,
+        description="Single plain-text paragraph in Spanish summarizing the period",
+    )
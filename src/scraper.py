@@ -1,86 +1,176 @@
 """Web scraping logic for Boletín Oficial."""
 
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree, html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
-# Spanish to English month mapping for date parsing
+# Spanish month names to month numbers for date parsing
 MESES = {
-    "Enero": "January",
-    "Febrero": "February",
-    "Marzo": "March",
-    "Abril": "April",
-    "Mayo": "May",
-    "Junio": "June",
-    "Julio": "July",
-    "Agosto": "August",
-    "Septiembre": "September",
-    "Octubre": "October",
-    "Noviembre": "November",
-    "Diciembre": "December",
+    "enero": 1,
+    "febrero": 2,
+    "marzo": 3,
+    "abril": 4,
+    "mayo": 5,
+    "junio": 6,
+    "julio": 7,
+    "agosto": 8,
+    "septiembre": 9,
+    "setiembre": 9,
+    "octubre": 10,
+    "noviembre": 11,
+    "diciembre": 12,
 }
+FECHA_RE = re.compile(r"(\d{1,2}) de (\w+) de (\d{4})")
 
 URL_BASE = "https://www.boletinoficial.gob.ar"
 URL_SECCION = f"{URL_BASE}/seccion/primera"
 
+# Compiled once: the date headings and every notice link of the section page
+FECHA_XPATH = etree.XPath(
+    "(//div[contains(concat(' ', normalize-space(@class), ' '),"
+    " ' fecha-ultima-edicion ')])[1]//h6"
+)
+AVISOS_XPATH = etree.XPath(
+    "//div[contains(concat(' ', normalize-space(@class), ' '),"
+    " ' avisosSeccionDiv ')]//a/@href"
+)
+
+# Detail pages are parsed incrementally until both of these nodes are closed
+DETALLE_TAG = "div"
+DETALLE_IDS = ("tituloDetalleAviso", "cuerpoDetalleAviso")
+DETALLE_COLUMNS = ["Título", "Texto", "Enlace"]
+CHUNK_SIZE = 65536
+# Larger detail pages are rejected, bounding memory per worker
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024
+
+# Maximum number of notice detail pages fetched concurrently
+MAX_WORKERS = 16
+
+# Connect and read timeouts in seconds, so a stalled page cannot hold a worker
+REQUEST_TIMEOUT = (5, 10)
+
+HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "scraper-boletin-oficial/0.1 (+https://www.boletinoficial.gob.ar)",
+}
+
+
+def crear_sesion(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """Create a session with pooled keep-alive connections and retries."""
+    retry = Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
 
-def obtener_fecha_publicacion(soup: BeautifulSoup) -> str:
+
+def obtener_fecha_publicacion(tree: html.HtmlElement) -> str:
     """Extract publication date from the page."""
-    fecha_div = soup.find("div", class_="margin-bottom-20 fecha-ultima-edicion")
-    fecha_texto = fecha_div.find_all("h6")[1].text.strip()
-    for mes_es, mes_en in MESES.items():
-        fecha_texto = fecha_texto.replace(mes_es, mes_en)
-    return datetime.strptime(fecha_texto, "%d de %B de %Y").strftime("%d/%m/%Y")
+    fecha_texto = FECHA_XPATH(tree)[1].text_content().strip()
+    match = FECHA_RE.fullmatch(fecha_texto)
+    if not match or match.group(2).lower() not in MESES:
+        raise ValueError(f"Unrecognized publication date: {fecha_texto!r}")
+    dia, mes, anio = match.groups()
+    return datetime(int(anio), MESES[mes.lower()], int(dia)).strftime("%d/%m/%Y")
+
+
+def _extraer_nodos_detalle(parser: etree.HTMLPullParser, nodos: dict) -> None:
+    """Collect the text of any detail node closed since the last call."""
+    for _, element in parser.read_events():
+        element_id = element.get("id")
+        if element_id in DETALLE_IDS:
+            nodos[element_id] = "".join(element.itertext()).strip()
 
 
 def obtener_detalles_aviso(session: requests.Session, url_detalle: str) -> dict | None:
     """Fetch details for a single notice."""
     try:
-        response = session.get(url_detalle)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        titulo = soup.find(id="tituloDetalleAviso").text.strip()
-        texto = soup.find(id="cuerpoDetalleAviso").text.strip()
-        return {"Título": titulo, "Texto": texto, "Enlace": url_detalle}
+        with session.get(url_detalle, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+
+            # Honour an explicit charset header; otherwise libxml2 reads the meta tag
+            content_type = response.headers.get("Content-Type", "")
+            encoding = response.encoding if "charset" in content_type else None
+            # Only div events are reported, since both detail nodes are divs
+            parser = etree.HTMLPullParser(
+                events=("end",), tag=DETALLE_TAG, encoding=encoding
+            )
+
+            nodos = {}
+            leidos = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                leidos += len(chunk)
+                if leidos > MAX_RESPONSE_BYTES:
+                    raise ValueError(f"response exceeds {MAX_RESPONSE_BYTES} bytes")
+                # Keep reading after both nodes are found, without parsing, so
+                # the connection goes back to the pool instead of being dropped
+                if len(nodos) < len(DETALLE_IDS):
+                    parser.feed(chunk)
+                    _extraer_nodos_detalle(parser, nodos)
+
+            if len(nodos) < len(DETALLE_IDS):
+                parser.close()
+                _extraer_nodos_detalle(parser, nodos)
+
+        faltantes = [node_id for node_id in DETALLE_IDS if node_id not in nodos]
+        if faltantes:
+            raise ValueError(f"missing nodes {faltantes}")
+
+        return {
+            "Título": nodos["tituloDetalleAviso"],
+            "Texto": nodos["cuerpoDetalleAviso"],
+            "Enlace": url_detalle,
+        }
     except Exception as e:
         logger.warning(f"Error fetching notice details from {url_detalle}: {e}")
         return None
 
 
-def scrape_regulations() -> pd.DataFrame:
+def scrape_regulations(max_workers: int = MAX_WORKERS) -> pd.DataFrame:
     """
     Scrape regulations from the Boletín Oficial first section.
 
+    Notice detail pages are fetched concurrently, since the work is
+    dominated by network latency rather than parsing.
+
+    Args:
+        max_workers: Maximum number of detail pages fetched in parallel
+
     Returns:
         DataFrame with columns: Título, Texto, Enlace, Fecha Publicación
     """
-    datos = []
-
-    with requests.Session() as session:
+    with crear_sesion(pool_size=max_workers) as session:
         try:
             logger.info(f"Fetching regulations from {URL_SECCION}")
-            response = session.get(URL_SECCION)
+            response = session.get(URL_SECCION, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            fecha_publicacion = obtener_fecha_publicacion(soup)
+            tree = html.fromstring(response.content)
+            fecha_publicacion = obtener_fecha_publicacion(tree)
             logger.info(f"Publication date: {fecha_publicacion}")
 
-            avisos = soup.find_all("div", class_="col-md-12 avisosSeccionDiv")
-            logger.info(f"Found {len(avisos)} notice sections")
+            urls = [f"{URL_BASE}{href}" for href in AVISOS_XPATH(tree)]
+            logger.info(f"Found {len(urls)} notice links")
 
-            for aviso in avisos:
-                enlaces = [a["href"] for a in aviso.find_all("a", href=True)]
-                for enlace in enlaces:
-                    url_detalle = f"{URL_BASE}{enlace}"
-                    detalle = obtener_detalles_aviso(session, url_detalle)
-                    if detalle:
-                        detalle["Fecha Publicación"] = fecha_publicacion
-                        datos.append(detalle)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                detalles = executor.map(partial(obtener_detalles_aviso, session), urls)
+                datos = [detalle for detalle in detalles if detalle]
 
             logger.info(f"Successfully scraped {len(datos)} regulations")
 
@@ -88,4 +178,7 @@ def scrape_regulations() -> pd.DataFrame:
             logger.error(f"Error scraping section: {e}")
             raise
 
-    return pd.DataFrame(datos)
+    # Every notice shares the section's date, so it is set as one column
+    regulations = pd.DataFrame(datos, columns=DETALLE_COLUMNS)
+    regulations["Fecha Publicación"] = fecha_publicacion
+    return regulations
@@ -1,10 +1,12 @@
-"""Excel storage operations for regulations."""
+"""Parquet storage operations for regulations, with an Excel export."""
 
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from src.config import Config
 
@@ -12,6 +14,135 @@ logger = logging.getLogger(__name__)
 
 SHEET_NAME = "resoluciones_relevantes"
 
+COLUMNS = [
+    "Fecha Publicación",
+    "Titulo_Generado",
+    "Categoria",
+    "Relevancia",
+    "Razonamiento",
+    "Resumen",
+    "Puntos_Clave",
+    "Enlace",
+]
+# Dates are stored as dates, so reads need no parsing; the rest is text
+SCHEMA = pa.schema(
+    [
+        (
+            column,
+            {"Fecha Publicación": pa.date32(), "Relevancia": pa.int64()}.get(
+                column, pa.string()
+            ),
+        )
+        for column in COLUMNS
+    ]
+)
+COMPRESSION = "zstd"
+# Format of the dates produced by the scraper and of legacy stored dates
+DATE_FORMAT = "%d/%m/%Y"
+EXCEL_DATE_FORMAT = "DD/MM/YYYY"
+
+
+def dataset_path(config: Config) -> Path:
+    """
+    Return the Parquet dataset directory for the configured Excel file.
+
+    Each save adds one file to the directory, so appending never rewrites
+    existing data; the Excel file is only an export of this dataset.
+    """
+    return config.excel_path.with_suffix(".parquet")
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert regulations to an Arrow table with the storage schema.
+
+    Arrow selects and casts the schema columns itself (whole-number floats
+    become int64, NaN becomes null), so no intermediate frame is copied.
+    Date strings are parsed here, once per row written; unparseable dates
+    are stored as null.
+    """
+    fechas = df["Fecha Publicación"]
+    if not pd.api.types.is_datetime64_any_dtype(fechas):
+        fechas = pd.to_datetime(fechas, format=DATE_FORMAT, errors="coerce")
+    table = pa.Table.from_pandas(
+        df.drop(columns="Fecha Publicación"),
+        schema=SCHEMA.remove(0),
+        preserve_index=False,
+    )
+    return table.add_column(0, SCHEMA.field(0), pa.array(fechas).cast(pa.date32()))
+
+
+def _write_part(df: pd.DataFrame, path: Path) -> None:
+    """Write df as a new file in the dataset at path."""
+    path.mkdir(parents=True, exist_ok=True)
+    # Timestamped names keep files, and therefore rows, in insertion order
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    pq.write_to_dataset(
+        _to_table(df),
+        root_path=path,
+        basename_template=f"{stamp}-{{i}}.parquet",
+        compression=COMPRESSION,
+    )
+
+
+def _read_dataset(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read every file of the dataset at path, optionally only some columns."""
+    table = pq.read_table(path, schema=SCHEMA, columns=columns)
+    return table.to_pandas(date_as_object=False)
+
+
+def _migrate_dates(path: Path) -> None:
+    """Rewrite dataset files written before dates were stored as dates."""
+    for part in sorted(path.glob("*.parquet")):
+        if pq.read_schema(part).field("Fecha Publicación").type == pa.string():
+            rows = pq.read_table(part).to_pandas()
+            tmp_part = part.with_name(f".{part.name}.tmp")
+            pq.write_table(_to_table(rows), tmp_part, compression=COMPRESSION)
+            tmp_part.replace(part)
+            logger.info(f"Converted dates in {part.name} to the date type")
+
+
+def _prune_dataset(path: Path, start_date: datetime, end_date: datetime) -> None:
+    """
+    Remove rows dated outside [start_date, end_date] from the dataset.
+
+    Only the date column of each file is read to decide; files with no rows
+    left are deleted, files with some old rows are rewritten in place and
+    files that are entirely in range are left untouched.
+    """
+    for part in sorted(path.glob("*.parquet")):
+        fechas = (
+            pq.read_table(part, columns=["Fecha Publicación"])
+            .column(0)
+            .to_pandas(date_as_object=False)
+        )
+        keep = fechas.between(start_date, end_date).to_numpy()
+        if keep.all():
+            continue
+        if not keep.any():
+            part.unlink()
+            continue
+
+        rows = pq.read_table(part, schema=SCHEMA).to_pandas().loc[keep]
+        tmp_part = part.with_name(f".{part.name}.tmp")
+        pq.write_table(_to_table(rows), tmp_part, compression=COMPRESSION)
+        tmp_part.replace(part)
+
+
+def _ensure_dataset(config: Config) -> Path:
+    """Create the dataset, seeding it from a legacy Excel file if present."""
+    path = dataset_path(config)
+    if path.exists():
+        _migrate_dates(path)
+        return path
+
+    path.mkdir(parents=True)
+    legacy_df = load_regulations(config.excel_path)
+    if not legacy_df.empty:
+        _write_part(legacy_df, path)
+        logger.info(f"Migrated {len(legacy_df)} regulations from {config.excel_path}")
+    return path
+
 
 def load_regulations(excel_path: Path) -> pd.DataFrame:
     """Load regulations from Excel file."""
@@ -30,7 +161,7 @@ def load_regulations(excel_path: Path) -> pd.DataFrame:
 
 def save_regulations(df: pd.DataFrame, config: Config) -> None:
     """
-    Save regulations to Excel file, appending to existing data.
+    Save regulations to the Parquet dataset, appending to existing data.
 
     Saves columns: Fecha Publicación, Titulo_Generado, Categoria, Relevancia,
     Razonamiento, Resumen, Puntos_Clave, Enlace
@@ -39,49 +170,31 @@ def save_regulations(df: pd.DataFrame, config: Config) -> None:
         logger.info("No regulations to save")
         return
 
-    excel_path = config.excel_path
-    excel_path.parent.mkdir(parents=True, exist_ok=True)
-
-    out_df = df[
-        [
-            "Fecha Publicación",
-            "Titulo_Generado",
-            "Categoria",
-            "Relevancia",
-            "Razonamiento",
-            "Resumen",
-            "Puntos_Clave",
-            "Enlace",
-        ]
-    ].copy()
+    path = _ensure_dataset(config)
+    _write_part(df, path)
+    logger.info(f"Appended {len(df)} rows to {path}")
 
-    if not excel_path.exists():
-        out_df.to_excel(excel_path, index=False, sheet_name=SHEET_NAME)
-        logger.info(f"Created new file: {excel_path}")
-    else:
-        with pd.ExcelWriter(
-            excel_path, engine="openpyxl", mode="a", if_sheet_exists="overlay"
-        ) as writer:
-            if SHEET_NAME in writer.book.sheetnames:
-                ws = writer.book[SHEET_NAME]
-                startrow = ws.max_row
-                out_df.to_excel(
-                    writer,
-                    index=False,
-                    sheet_name=SHEET_NAME,
-                    startrow=startrow,
-                    header=False,
-                )
-                logger.info(f"Appended {len(out_df)} rows to {excel_path}")
-            else:
-                out_df.to_excel(writer, index=False, sheet_name=SHEET_NAME)
-                logger.info(f"Created new sheet in {excel_path}")
+
+def export_regulations_excel(config: Config) -> None:
+    """Rewrite the Excel file from the Parquet dataset for delivery."""
+    path = _ensure_dataset(config)
+    df = _read_dataset(path)
+    config.excel_path.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(config.excel_path) as writer:
+        df.to_excel(writer, index=False, sheet_name=SHEET_NAME)
+        # The openpyxl writer ignores pandas' date formats, so set them per cell
+        columna = df.columns.get_loc("Fecha Publicación") + 1
+        hoja = writer.sheets[SHEET_NAME]
+        for (celda,) in hoja.iter_rows(min_row=2, min_col=columna, max_col=columna):
+            celda.number_format = EXCEL_DATE_FORMAT
+    logger.info(f"Exported {len(df)} regulations to {config.excel_path}")
 
 
 def get_recent_regulations(
     config: Config,
     days: int = 7,
     archive_old: bool = True,
+    columns: list[str] | None = None,
 ) -> pd.DataFrame:
     """
     Get regulations from the last N days.
@@ -89,54 +202,42 @@ def get_recent_regulations(
     Args:
         config: Application configuration
         days: Number of days to look back
-        archive_old: If True, remove older regulations from the file
+        archive_old: If True, remove older regulations from the dataset
+        columns: Columns to read, or None for all; only these are decoded
 
     Returns:
         DataFrame with recent regulations sorted by date
     """
-    excel_path = config.excel_path
-
-    if not excel_path.exists():
-        logger.warning(f"Excel file not found: {excel_path}")
+    if not dataset_path(config).exists() and not config.excel_path.exists():
+        logger.warning(f"No stored regulations found at {dataset_path(config)}")
         return pd.DataFrame()
 
-    df = pd.read_excel(excel_path, sheet_name=SHEET_NAME).copy()
+    if columns is not None and "Fecha Publicación" not in columns:
+        columns = ["Fecha Publicación", *columns]
+
+    path = _ensure_dataset(config)
+    df = _read_dataset(path, columns)
 
     if df.empty:
         return df
 
-    # Convert date column
-    df["Fecha Publicación"] = pd.to_datetime(
-        df["Fecha Publicación"], format="%d/%m/%Y", errors="coerce"
-    )
-    df = df.dropna(subset=["Fecha Publicación"])
+    # Dates are stored parsed, so they are only sorted; rows without a
+    # valid date are dropped
+    fechas = df["Fecha Publicación"].dropna().sort_values(kind="stable")
 
     # Calculate date range
     end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     start_date = end_date - timedelta(days=days - 1)
 
-    # Filter by date
-    mask = (df["Fecha Publicación"] >= start_date) & (
-        df["Fecha Publicación"] <= end_date
-    )
-    filtered = df.loc[mask].sort_values(by="Fecha Publicación", ascending=True).copy()
-
-    # Format date back to string
-    filtered["Fecha Publicación"] = filtered["Fecha Publicación"].dt.strftime(
-        "%d/%m/%Y"
-    )
+    # Dates are sorted, so the range is one contiguous slice
+    inicio, fin = fechas.searchsorted([start_date, end_date + timedelta(days=1)])
+    filtered = df.loc[fechas.index[inicio:fin]]
+    kept = len(filtered)
 
     # Archive old regulations
-    if archive_old and mask.sum() < len(df):
-        updated_df = df.loc[mask].copy()
-        updated_df["Fecha Publicación"] = updated_df["Fecha Publicación"].dt.strftime(
-            "%d/%m/%Y"
-        )
-        with pd.ExcelWriter(excel_path, mode="w", engine="openpyxl") as writer:
-            updated_df.to_excel(writer, sheet_name=SHEET_NAME, index=False)
-        logger.info(
-            f"Archived {len(df) - mask.sum()} old regulations, kept {mask.sum()}"
-        )
+    if archive_old and kept < len(df):
+        _prune_dataset(path, start_date, end_date)
+        logger.info(f"Archived {len(df) - kept} old regulations, kept {kept}")
 
     logger.info(f"Found {len(filtered)} regulations from the last {days} days")
     return filtered
@@ -1,11 +1,36 @@
 """Shared fixtures for tests."""
 
 from datetime import datetime, timedelta
+from io import BytesIO
 from pathlib import Path
 
 import pandas as pd
 import pytest
 
+from src.config import Config
+from src.storage import load_regulations
+
+EMPTY_DF_COLS = (
+    "Fecha Publicación",
+    "Titulo_Generado",
+    "Categoria",
+    "Relevancia",
+    "Razonamiento",
+    "Resumen",
+    "Puntos_Clave",
+    "Enlace",
+)
+
+
+def fake_enrich(client, text: str, model: str, cache=None) -> dict:
+    """Stand in for enrich_text with a result derived from the text."""
+    return {
+        "summary": f"s-{text}",
+        "key_points": ["a", "b"],
+        "title": f"t-{text}",
+        "category": "Granos",
+    }
+
 
 @pytest.fixture
 def project_root() -> Path:
@@ -20,14 +45,33 @@ def fixtures_dir() -> Path:
 
 
 @pytest.fixture
-def test_data_path(fixtures_dir: Path) -> Path:
-    """Return path to test data Excel file."""
-    return fixtures_dir / "test_data.xlsx"
+def config(tmp_path: Path) -> Config:
+    """Return a configuration pointing at a temporary directory."""
+    return Config(
+        project_dir=tmp_path,
+        output_dir=tmp_path,
+        data_dir=tmp_path,
+        log_dir=tmp_path,
+        excel_path=tmp_path / "test.xlsx",
+        openai_api_key="sk-test",
+        llm_cache_path=tmp_path / "cache.sqlite",
+    )
 
 
 @pytest.fixture
-def sample_regulations_df() -> pd.DataFrame:
-    """Create a sample DataFrame with regulation data for testing."""
+def scraped_df() -> pd.DataFrame:
+    """Create a DataFrame shaped like the scraper output."""
+    return pd.DataFrame({
+        "Título": ["Aviso 1", "Aviso 2", "Aviso 3"],
+        "Texto": ["texto soja", "texto pyme", "texto trigo"],
+        "Enlace": ["https://x/1", "https://x/2", "https://x/3"],
+        "Fecha Publicación": ["01/01/2024"] * 3,
+    })
+
+
+@pytest.fixture(scope="session")
+def _sample_regulations() -> pd.DataFrame:
+    """Build the sample regulations once per test session."""
     today = datetime.now()
     dates = [
         (today - timedelta(days=i)).strftime("%d/%m/%Y")
@@ -76,19 +120,48 @@ def sample_regulations_df() -> pd.DataFrame:
     })
 
 
+@pytest.fixture
+def sample_regulations_df(_sample_regulations: pd.DataFrame) -> pd.DataFrame:
+    """Return a fresh copy of the sample regulations, safe to modify."""
+    return _sample_regulations.copy()
+
+
+@pytest.fixture(scope="session")
+def sample_regulations_df_head2(_sample_regulations: pd.DataFrame) -> pd.DataFrame:
+    """Return the first two sample regulations, shared across the session."""
+    return _sample_regulations.head(2).copy()
+
+
+@pytest.fixture(scope="session")
+def sample_xlsx_bytes(_sample_regulations: pd.DataFrame) -> bytes:
+    """Serialize the sample regulations to an Excel workbook once per session."""
+    buffer = BytesIO()
+    _sample_regulations.to_excel(
+        buffer, index=False, sheet_name="resoluciones_relevantes"
+    )
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="session")
+def test_data_path(
+    tmp_path_factory: pytest.TempPathFactory, sample_xlsx_bytes: bytes
+) -> Path:
+    """Write the test data Excel file once per session and return its path."""
+    path = tmp_path_factory.mktemp("fixtures") / "test_data.xlsx"
+    path.write_bytes(sample_xlsx_bytes)
+    return path
+
+
+@pytest.fixture(scope="session")
+def loaded_test_data(test_data_path: Path) -> pd.DataFrame:
+    """Load the test data Excel file once per session."""
+    return load_regulations(test_data_path)
+
+
 @pytest.fixture
 def empty_df() -> pd.DataFrame:
     """Create an empty DataFrame with the expected columns."""
-    return pd.DataFrame(columns=[
-        "Fecha Publicación",
-        "Titulo_Generado",
-        "Categoria",
-        "Relevancia",
-        "Razonamiento",
-        "Resumen",
-        "Puntos_Clave",
-        "Enlace",
-    ])
+    return pd.DataFrame(columns=list(EMPTY_DF_COLS))
 
 
 @pytest.fixture
@@ -0,0 +1,265 @@
+"""Tests for batch module."""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+from scrape_boletin import main
+from src.batch import (
+    BATCH_ENDPOINT,
+    batch_dir,
+    build_batch_requests,
+    build_enrich_requests,
+    classify_regulations_batch,
+    collect_classification_batch,
+    discard_batch_run,
+    parse_batch_output,
+    pending_runs,
+    submit_classification_batch,
+)
+from src.classifier import CLASSIFY_SYSTEM, ENRICH_SYSTEM
+from src.config import Config
+from tests.conftest import fake_enrich
+
+SCORES = {"texto soja": 90, "texto pyme": 0, "texto trigo": 80}
+
+
+def output_line(custom_id: str, texts: list[str]) -> str:
+    """Build a successful batch output line classifying texts with SCORES."""
+    results = [
+        {"index": i, "relevance_score": SCORES[text], "reasoning": f"r-{text}"}
+        for i, text in enumerate(texts, start=1)
+    ]
+    message = {"content": json.dumps({"results": results})}
+    body = {"choices": [{"message": message}]}
+    return json.dumps({
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "body": body},
+        "error": None,
+    })
+
+
+def enrich_line(custom_id: str, text: str) -> str:
+    """Build a successful batch output line enriching text like fake_enrich."""
+    message = {"content": json.dumps(fake_enrich(None, text, "model"))}
+    body = {"choices": [{"message": message}]}
+    return json.dumps({
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "body": body},
+        "error": None,
+    })
+
+
+def fake_output(input_text: str) -> str:
+    """Answer every classification or enrichment request of a batch input file."""
+    lines = []
+    for line in input_text.splitlines():
+        request = json.loads(line)
+        user = request["body"]["messages"][1]["content"]
+        if user.startswith("Text: "):
+            lines.append(enrich_line(request["custom_id"], user.removeprefix("Text: ")))
+            continue
+        texts = [chunk.split(": ", 1)[1] for chunk in user.split("\n\n")]
+        lines.append(output_line(request["custom_id"], texts))
+    return "\n".join(lines)
+
+
+def batch_client(statuses: list[str]) -> MagicMock:
+    """Return a client whose batches go through statuses, then serve output."""
+    client = MagicMock()
+    uploads = {}
+    batches = {}
+
+    def create_file(file, purpose: str) -> SimpleNamespace:
+        uploads[f"file-{len(uploads) + 1}"] = file.read().decode("utf-8")
+        return SimpleNamespace(id=f"file-{len(uploads)}")
+
+    def create_batch(input_file_id: str, **kwargs) -> SimpleNamespace:
+        batches[f"batch-{len(batches) + 1}"] = input_file_id
+        return SimpleNamespace(id=f"batch-{len(batches)}")
+
+    status_iter = iter(statuses)
+    client.files.create.side_effect = create_file
+    client.batches.create.side_effect = create_batch
+    client.batches.retrieve.side_effect = lambda batch_id: SimpleNamespace(
+        id=batch_id, status=next(status_iter), output_file_id=f"out-{batch_id}"
+    )
+    client.files.content.side_effect = lambda file_id: SimpleNamespace(
+        text=fake_output(uploads[batches[file_id.removeprefix("out-")]])
+    )
+    return client
+
+
+class TestBuildBatchRequests:
+    """Tests for build_batch_requests function."""
+
+    def test_build_batch_requests(self) -> None:
+        """Test one chat completion request is built per group of texts."""
+        requests = build_batch_requests([["a", "b"], ["c"]], "model")
+
+        assert [r["custom_id"] for r in requests] == ["0", "1"]
+        assert {r["url"] for r in requests} == {BATCH_ENDPOINT}
+        body = requests[0]["body"]
+        assert body["model"] == "model"
+        assert body["messages"][0]["content"] == CLASSIFY_SYSTEM
+        assert body["messages"][1]["content"] == "Text 1: a\n\nText 2: b"
+        assert body["response_format"]["json_schema"]["strict"] is True
+        schema = body["response_format"]["json_schema"]["schema"]
+        assert schema["additionalProperties"] is False
+        assert schema["$defs"]["BatchRelevanceItem"]["additionalProperties"] is False
+
+    def test_build_enrich_requests(self) -> None:
+        """Test one enrichment request is built per text."""
+        requests = build_enrich_requests(["a", "b"], "model")
+
+        assert [r["custom_id"] for r in requests] == ["0", "1"]
+        body = requests[1]["body"]
+        assert body["messages"][0]["content"] == ENRICH_SYSTEM
+        assert body["messages"][1]["content"] == "Text: b"
+        schema = body["response_format"]["json_schema"]
+        assert schema["name"] == "RegulationEnrichment"
+
+
+class TestParseBatchOutput:
+    """Tests for parse_batch_output function."""
+
+    def test_parse_batch_output_matches_custom_id(self) -> None:
+        """Test results are assigned to the keys of their request."""
+        lines = [
+            output_line("1", ["texto trigo"]),
+            output_line("0", ["texto soja", "texto pyme"]),
+        ]
+
+        results = parse_batch_output(lines, [["k1", "k2"], ["k3"]])
+
+        assert results["k1"]["relevance_score"] == 90
+        assert results["k2"]["relevance_score"] == 0
+        assert results["k3"]["reasoning"] == "r-texto trigo"
+
+    def test_parse_batch_output_skips_failed_requests(self) -> None:
+        """Test failed requests are left out so they can be retried."""
+        failed = json.dumps({
+            "custom_id": "0",
+            "response": None,
+            "error": {"message": "boom"},
+        })
+
+        assert parse_batch_output([failed], [["k1"]]) == {}
+
+
+class TestClassifyRegulationsBatch:
+    """Tests for submitting and collecting classification batches."""
+
+    def test_submit_and_collect(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test relevant rows are classified, then enriched, by two batches."""
+        client = batch_client(["in_progress", "completed", "completed"])
+        with (
+            patch("src.batch.get_client", return_value=client),
+            patch("src.classifier.classify_batch") as mock_classify,
+            patch("src.classifier.enrich_text") as mock_enrich,
+        ):
+            assert submit_classification_batch(scraped_df, config) == "batch-1"
+            assert collect_classification_batch(config) is None
+            assert collect_classification_batch(config) is None
+            result = collect_classification_batch(config)
+
+        mock_classify.assert_not_called()
+        mock_enrich.assert_not_called()
+        assert client.batches.create.call_count == 2
+        assert list(result["Texto"]) == ["texto soja", "texto trigo"]
+        assert list(result["Relevancia"]) == [90, 80]
+        assert list(result["Resumen"]) == ["s-texto soja", "s-texto trigo"]
+        assert list(result["Puntos_Clave"]) == ["a; b", "a; b"]
+        (run_id,) = pending_runs(config)
+        discard_batch_run(config, run_id)
+        assert list(batch_dir(config).iterdir()) == []
+
+    def test_failed_batch_falls_back_to_regular_requests(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test texts are classified and enriched directly when batches expire."""
+
+        def fake_classify_batch(client, texts: list[str], model: str) -> list[dict]:
+            return [
+                {"relevance_score": SCORES[text], "reasoning": "sync"}
+                for text in texts
+            ]
+
+        client = batch_client(["expired", "expired"])
+        with (
+            patch("src.batch.get_client", return_value=client),
+            patch(
+                "src.classifier.classify_batch", side_effect=fake_classify_batch
+            ),
+            patch("src.classifier.enrich_text", side_effect=fake_enrich),
+        ):
+            result = classify_regulations_batch(
+                scraped_df, config, "20240101", poll_seconds=0
+            )
+
+        assert list(result["Relevancia"]) == [90, 80]
+        assert set(result["Razonamiento"]) == {"sync"}
+        assert list(result["Resumen"]) == ["s-texto soja", "s-texto trigo"]
+
+    def test_cached_texts_are_not_submitted(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test no batch is created when every result is already cached."""
+        client = batch_client(["completed", "completed"])
+        with patch("src.batch.get_client", return_value=client):
+            classify_regulations_batch(scraped_df, config, "20240101", poll_seconds=0)
+            discard_batch_run(config, "20240101")
+            client.batches.create.reset_mock()
+
+            assert submit_classification_batch(scraped_df, config) is None
+            result = collect_classification_batch(config)
+
+        client.batches.create.assert_not_called()
+        assert list(result["Relevancia"]) == [90, 80]
+        assert list(result["Resumen"]) == ["s-texto soja", "s-texto trigo"]
+
+    def test_pending_run_is_kept_when_next_run_is_submitted(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test a new submission never replaces a run that was not collected."""
+        client = batch_client(["in_progress"] + ["completed"] * 4)
+        with patch("src.batch.get_client", return_value=client):
+            submit_classification_batch(scraped_df.head(1), config, "20240101")
+            assert collect_classification_batch(config) is None
+            submit_classification_batch(scraped_df.tail(1), config, "20240102")
+
+            assert pending_runs(config) == ["20240101", "20240102"]
+            # Runs are collected oldest first, each through both batch stages
+            assert collect_classification_batch(config) is None
+            first = collect_classification_batch(config)
+            discard_batch_run(config, "20240101")
+            assert collect_classification_batch(config) is None
+            second = collect_classification_batch(config)
+
+        assert list(first["Texto"]) == ["texto soja"]
+        assert list(second["Texto"]) == ["texto trigo"]
+        assert pending_runs(config) == ["20240102"]
+
+    def test_run_is_kept_when_saving_fails(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test a collected run survives a failed save and can be collected again."""
+        config.use_batch_api = True
+        client = batch_client(["completed"] * 3)
+        with (
+            patch("scrape_boletin.load_config", return_value=config),
+            patch("scrape_boletin.scrape_regulations", return_value=scraped_df),
+            patch("scrape_boletin.save_regulations", side_effect=OSError("disk full")),
+            patch("src.batch.get_client", return_value=client),
+            patch("src.batch.time.sleep"),
+        ):
+            assert main() == 1
+
+            (run_id,) = pending_runs(config)
+            result = collect_classification_batch(config, run_id)
+
+        assert list(result["Texto"]) == ["texto soja", "texto trigo"]
@@ -0,0 +1,447 @@
+"""Tests for classifier module."""
+
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from src.classifier import (
+    CLASSIFY_FALLBACK,
+    CLASSIFY_MAX_CHARS,
+    CLASSIFY_MAX_TOKENS_PER_TEXT,
+    CLASSIFY_SYSTEM,
+    EMBEDDING_BATCH_SIZE,
+    ENRICH_FALLBACK,
+    ENRICH_MAX_CHARS,
+    PREFILTER_RESULT,
+    RELEVANCE_PROTOTYPES,
+    classify_batch,
+    classify_regulations,
+    classify_texts,
+    enrich_text,
+    enrich_texts,
+    keyword_candidates,
+    prototype_similarity,
+)
+from src.config import Config
+from src.llm_cache import LLMCache, make_key
+from src.models import (
+    BatchRelevanceClassification,
+    BatchRelevanceItem,
+    RegulationEnrichment,
+)
+from tests.conftest import fake_enrich
+
+
+def fake_classify_batch(client, texts: list[str], model: str) -> list[dict]:
+    scores = {"texto soja": 90, "texto pyme": 0, "texto trigo": 80}
+    return [
+        {"relevance_score": scores[text], "reasoning": f"r-{text}"} for text in texts
+    ]
+
+
+def parsed_response(items: list[BatchRelevanceItem]) -> SimpleNamespace:
+    """Build a minimal stand-in for a parsed chat completion."""
+    parsed = BatchRelevanceClassification(results=items)
+    message = SimpleNamespace(parsed=parsed)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_embeddings_create(model: str, input: list[str]) -> SimpleNamespace:
+    """Embed prototypes and 'soja' texts on one axis, everything else on another."""
+    data = [
+        SimpleNamespace(
+            embedding=[3.0, 0.0]
+            if text in RELEVANCE_PROTOTYPES or "soja" in text
+            else [0.0, 2.0]
+        )
+        for text in input
+    ]
+    return SimpleNamespace(data=data)
+
+
+class TestClassifyBatch:
+    """Tests for classify_batch function."""
+
+    def test_classify_batch_orders_by_index(self) -> None:
+        """Test results are matched to texts by index, not response order."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.return_value = parsed_response([
+            BatchRelevanceItem(index=2, relevance_score=10, reasoning="b"),
+            BatchRelevanceItem(index=1, relevance_score=90, reasoning="a"),
+        ])
+
+        result = classify_batch(client, ["uno", "dos"], "model")
+
+        assert result == [
+            {"relevance_score": 90, "reasoning": "a"},
+            {"relevance_score": 10, "reasoning": "b"},
+        ]
+        client.beta.chat.completions.parse.assert_called_once()
+
+    def test_classify_batch_caps_output_tokens(self) -> None:
+        """Test the output token cap scales with the number of texts."""
+        client = MagicMock()
+
+        classify_batch(client, ["uno", "dos", "tres"], "model")
+
+        kwargs = client.beta.chat.completions.parse.call_args.kwargs
+        assert kwargs["max_tokens"] == 3 * CLASSIFY_MAX_TOKENS_PER_TEXT
+
+    def test_classify_batch_static_system_prompt(self) -> None:
+        """Test instructions are a fixed system message and texts the user one."""
+        client = MagicMock()
+
+        classify_batch(client, ["uno", "dos"], "model")
+        classify_batch(client, ["tres"], "model")
+
+        first, second = (
+            c.kwargs["messages"]
+            for c in client.beta.chat.completions.parse.call_args_list
+        )
+        assert first[0] == second[0] == {"role": "system", "content": CLASSIFY_SYSTEM}
+        assert first[1]["content"] == "Text 1: uno\n\nText 2: dos"
+        assert second[1]["content"] == "Text 1: tres"
+
+    def test_classify_batch_missing_result_uses_fallback(self) -> None:
+        """Test texts without a result get the fallback value."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.return_value = parsed_response([
+            BatchRelevanceItem(index=1, relevance_score=90, reasoning="a"),
+        ])
+
+        result = classify_batch(client, ["uno", "dos"], "model")
+
+        assert result[1] == CLASSIFY_FALLBACK
+
+    def test_classify_batch_api_error(self) -> None:
+        """Test API errors yield the fallback for every text."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.side_effect = Exception("API Error")
+
+        result = classify_batch(client, ["uno", "dos"], "model")
+
+        assert result == [CLASSIFY_FALLBACK, CLASSIFY_FALLBACK]
+
+
+class TestEnrichText:
+    """Tests for enrich_text function."""
+
+    def test_enrich_text_single_request(self) -> None:
+        """Test summary and title fields come from one request."""
+        client = MagicMock()
+        parsed = RegulationEnrichment(
+            summary="Resumen", key_points=["a"], title="Título", category="Granos"
+        )
+        client.beta.chat.completions.parse.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed))]
+        )
+
+        result = enrich_text(client, "texto soja", "model")
+
+        assert result == {
+            "summary": "Resumen",
+            "key_points": ["a"],
+            "title": "Título",
+            "category": "Granos",
+        }
+        client.beta.chat.completions.parse.assert_called_once()
+
+    def test_enrich_text_api_error(self) -> None:
+        """Test API errors yield the fallback value."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.side_effect = Exception("API Error")
+
+        assert enrich_text(client, "texto soja", "model") == ENRICH_FALLBACK
+
+
+class TestPromptTruncation:
+    """Tests for truncation of long texts before prompting."""
+
+    def test_long_text_is_truncated_in_prompt(self) -> None:
+        """Test only the first ENRICH_MAX_CHARS characters reach the model."""
+        client = MagicMock()
+        text = "palabra " * ENRICH_MAX_CHARS
+
+        enrich_text(client, text, "model")
+
+        messages = client.beta.chat.completions.parse.call_args.kwargs["messages"]
+        prompt = messages[-1]["content"]
+        assert "palabra" in prompt
+        assert len(prompt) <= ENRICH_MAX_CHARS + len("Text: ")
+
+    def test_classification_uses_stricter_cap(self) -> None:
+        """Test texts are cut to CLASSIFY_MAX_CHARS in classification batches."""
+        client = MagicMock()
+        text = "palabra " * ENRICH_MAX_CHARS
+
+        classify_batch(client, [text], "model")
+
+        messages = client.beta.chat.completions.parse.call_args.kwargs["messages"]
+        assert len(messages[-1]["content"]) <= CLASSIFY_MAX_CHARS + len("Text 1: ")
+
+    def test_short_text_is_sent_whole(self) -> None:
+        """Test texts under the cap are not modified."""
+        client = MagicMock()
+
+        enrich_text(client, "Resolución corta sobre soja.", "model")
+
+        messages = client.beta.chat.completions.parse.call_args.kwargs["messages"]
+        assert "Resolución corta sobre soja." in messages[-1]["content"]
+
+
+class TestClassifyTexts:
+    """Tests for classify_texts function."""
+
+    def test_classify_texts_splits_into_batches(self) -> None:
+        """Test texts are sent in batches and results keep input order."""
+        texts = ["texto soja", "texto pyme", "texto trigo"]
+        with patch(
+            "src.classifier.classify_batch", side_effect=fake_classify_batch
+        ) as mock_batch:
+            result = classify_texts(None, texts, "model", batch_size=2, max_workers=2)
+
+        assert [r["relevance_score"] for r in result] == [90, 0, 80]
+        assert sorted(len(c.args[1]) for c in mock_batch.call_args_list) == [1, 2]
+
+    def test_classify_texts_deduplicates(self) -> None:
+        """Test repeated texts are sent once and the result is broadcast."""
+        texts = ["texto soja", "texto pyme", "texto soja", "texto soja"]
+        with patch(
+            "src.classifier.classify_batch", side_effect=fake_classify_batch
+        ) as mock_batch:
+            result = classify_texts(None, texts, "model", batch_size=10, max_workers=2)
+
+        assert mock_batch.call_args.args[1] == ["texto soja", "texto pyme"]
+        assert [r["relevance_score"] for r in result] == [90, 0, 90, 90]
+
+    def test_classify_texts_deduplicates_by_normalized_text(self) -> None:
+        """Test texts that only differ in whitespace are sent once."""
+        texts = ["texto soja", " texto\n soja "]
+        with patch(
+            "src.classifier.classify_batch", side_effect=fake_classify_batch
+        ) as mock_batch:
+            result = classify_texts(None, texts, "model", batch_size=10, max_workers=2)
+
+        assert mock_batch.call_count == 1
+        assert [r["relevance_score"] for r in result] == [90, 90]
+
+    def test_classify_texts_skips_cached(self, tmp_path: Path) -> None:
+        """Test cached texts are not sent to the model again."""
+        texts = ["texto soja", "texto trigo"]
+        with LLMCache(tmp_path / "cache.sqlite") as cache:
+            with patch(
+                "src.classifier.classify_batch", side_effect=fake_classify_batch
+            ) as mock_batch:
+                classify_texts(None, texts, "model", 10, 2, cache=cache)
+                result = classify_texts(None, texts, "model", 10, 2, cache=cache)
+
+        assert mock_batch.call_count == 1
+        assert [r["relevance_score"] for r in result] == [90, 80]
+
+
+class TestEnrichTexts:
+    """Tests for enrich_texts function."""
+
+    def test_enrich_texts_keeps_order_and_deduplicates(self) -> None:
+        """Test results follow input order and each distinct text is sent once."""
+        texts = ["texto soja", "texto trigo", "texto soja"]
+        with patch(
+            "src.classifier.enrich_text", side_effect=fake_enrich
+        ) as mock_enrich:
+            result = enrich_texts(None, texts, "model", max_workers=2)
+
+        assert mock_enrich.call_count == 2
+        assert [r["summary"] for r in result] == [f"s-{text}" for text in texts]
+
+
+class TestPrototypeSimilarity:
+    """Tests for prototype_similarity function."""
+
+    def test_prototype_similarity(self) -> None:
+        """Test similarity is the normalized dot product with the prototypes."""
+        client = MagicMock()
+        client.embeddings.create.side_effect = fake_embeddings_create
+
+        result = prototype_similarity(client, ["texto soja", "texto pyme"], "m")
+
+        assert result.tolist() == pytest.approx([1.0, 0.0])
+
+    def test_prototype_similarity_batches_concurrently(self) -> None:
+        """Test texts are embedded in batches and results keep input order."""
+        client = MagicMock()
+        client.embeddings.create.side_effect = fake_embeddings_create
+        texts = ["texto soja", "texto pyme"] * EMBEDDING_BATCH_SIZE
+
+        result = prototype_similarity(client, texts, "m", max_workers=4)
+
+        assert client.embeddings.create.call_count == 3
+        assert result.tolist() == pytest.approx([1.0, 0.0] * EMBEDDING_BATCH_SIZE)
+
+
+class TestKeywordCandidates:
+    """Tests for keyword_candidates function."""
+
+    def test_keyword_candidates(self) -> None:
+        """Test only texts with negative and no positive keywords are dropped."""
+        texts = pd.Series([
+            "Programa de asistencia a empresas MiPyME del sector turismo",
+            "Régimen MiPyME para exportadores de soja",
+            "Designación de personal en el Ministerio",
+            "Precios de referencia del MAÍZ",
+        ])
+
+        result = keyword_candidates(texts)
+
+        assert result.tolist() == [False, True, True, True]
+
+    def test_keyword_candidates_require_positive(self) -> None:
+        """Test texts without an agricultural keyword are dropped when required."""
+        texts = pd.Series([
+            "Designación de personal en el Ministerio",
+            "Régimen MiPyME para exportadores de soja",
+            "Actualízase el importe de la tasa de servicios",
+            "Régimen de importación temporaria",
+            None,
+        ])
+
+        result = keyword_candidates(texts, require_positive=True)
+
+        assert result.tolist() == [False, True, False, True, False]
+
+
+class TestClassifyRegulations:
+    """Tests for classify_regulations function."""
+
+    def test_classify_regulations_empty(self, config: Config) -> None:
+        """Test empty DataFrame is returned unchanged."""
+        result = classify_regulations(pd.DataFrame(), config)
+
+        assert result.empty
+
+    def test_classify_regulations_filters_and_enriches(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test rows above threshold are kept and enriched in order."""
+        with (
+            patch("src.classifier.get_client"),
+            patch("src.classifier.classify_batch", side_effect=fake_classify_batch),
+            patch("src.classifier.enrich_text", side_effect=fake_enrich),
+        ):
+            result = classify_regulations(scraped_df, config)
+
+        assert list(result["Texto"]) == ["texto soja", "texto trigo"]
+        assert list(result["Relevancia"]) == [90, 80]
+        assert list(result["Razonamiento"]) == ["r-texto soja", "r-texto trigo"]
+        assert list(result["Resumen"]) == ["s-texto soja", "s-texto trigo"]
+        assert list(result["Puntos_Clave"]) == ["a; b", "a; b"]
+        assert list(result["Titulo_Generado"]) == ["t-texto soja", "t-texto trigo"]
+        assert list(result["Categoria"]) == ["Granos", "Granos"]
+
+    def test_classify_regulations_enriches_duplicates_once(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test republished texts are enriched only once."""
+        scraped_df["Texto"] = ["texto soja", "texto soja", "texto trigo"]
+        with (
+            patch("src.classifier.get_client"),
+            patch("src.classifier.classify_batch", side_effect=fake_classify_batch),
+            patch(
+                "src.classifier.enrich_text", side_effect=fake_enrich
+            ) as mock_enrich,
+        ):
+            result = classify_regulations(scraped_df, config)
+
+        assert mock_enrich.call_count == 2
+        assert list(result["Enlace"]) == ["https://x/1", "https://x/2", "https://x/3"]
+        assert list(result["Resumen"]) == [
+            "s-texto soja", "s-texto soja", "s-texto trigo"
+        ]
+
+    def test_classify_regulations_embedding_prefilter(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test texts below the similarity floor are not sent to the classifier."""
+        config.embedding_prefilter = True
+        with (
+            patch("src.classifier.get_client") as mock_openai,
+            patch(
+                "src.classifier.classify_batch", side_effect=fake_classify_batch
+            ) as mock_batch,
+            patch("src.classifier.enrich_text", side_effect=fake_enrich),
+        ):
+            mock_openai.return_value.embeddings.create.side_effect = (
+                fake_embeddings_create
+            )
+            result = classify_regulations(scraped_df, config)
+
+        sent = [text for c in mock_batch.call_args_list for text in c.args[1]]
+        assert sent == ["texto soja"]
+        assert list(result["Texto"]) == ["texto soja"]
+
+    def test_classify_regulations_keyword_prefilter(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test texts ruled out by keywords are neither embedded nor classified."""
+        config.keyword_prefilter = True
+        config.embedding_prefilter = True
+        scraped_df["Texto"] = ["texto soja", "texto mipyme", "texto trigo"]
+        with (
+            patch("src.classifier.get_client") as mock_openai,
+            patch(
+                "src.classifier.classify_batch", side_effect=fake_classify_batch
+            ) as mock_batch,
+            patch("src.classifier.enrich_text", side_effect=fake_enrich),
+        ):
+            embeddings = mock_openai.return_value.embeddings
+            embeddings.create.side_effect = fake_embeddings_create
+            classify_regulations(scraped_df, config)
+
+        embedded = embeddings.create.call_args.kwargs["input"]
+        assert "texto mipyme" not in embedded
+        sent = [text for c in mock_batch.call_args_list for text in c.args[1]]
+        assert sent == ["texto soja"]
+
+    def test_classify_regulations_prefilter_skips_scored_texts(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test texts scored on an earlier run are not embedded again."""
+        config.embedding_prefilter = True
+        with LLMCache(config.llm_cache_path) as cache:
+            cache.set(
+                make_key("classify", config.classification_model, "texto trigo"),
+                {"relevance_score": 80, "reasoning": "r-texto trigo"},
+            )
+        with (
+            patch("src.classifier.get_client") as mock_get_client,
+            patch("src.classifier.classify_batch", side_effect=fake_classify_batch),
+            patch("src.classifier.enrich_text", side_effect=fake_enrich),
+        ):
+            embeddings = mock_get_client.return_value.embeddings
+            embeddings.create.side_effect = fake_embeddings_create
+            result = classify_regulations(scraped_df, config)
+
+        assert "texto trigo" not in embeddings.create.call_args.kwargs["input"]
+        assert list(result["Texto"]) == ["texto soja", "texto trigo"]
+
+    def test_classify_regulations_prefilter_result(
+        self, config: Config, scraped_df: pd.DataFrame
+    ) -> None:
+        """Test rows dropped by the prefilter get a zero score, not an error."""
+        config.embedding_prefilter = True
+        config.relevance_threshold = -1
+        with (
+            patch("src.classifier.get_client") as mock_openai,
+            patch("src.classifier.classify_batch", side_effect=fake_classify_batch),
+            patch("src.classifier.enrich_text", side_effect=fake_enrich),
+        ):
+            mock_openai.return_value.embeddings.create.side_effect = (
+                fake_embeddings_create
+            )
+            result = classify_regulations(scraped_df, config)
+
+        pyme = result[result["Texto"] == "texto pyme"].iloc[0]
+        assert pyme["Relevancia"] == PREFILTER_RESULT["relevance_score"]
+        assert pyme["Razonamiento"] == PREFILTER_RESULT["reasoning"]
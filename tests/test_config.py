@@ -192,12 +192,24 @@ class TestSetupLogging:
         assert len(logger.handlers) == 2  # File + console
 
     def test_setup_logging_creates_log_file(self, tmp_path: Path) -> None:
-        """Test creates log file in specified directory."""
+        """Test creates log file in specified directory on the first record."""
         logger = setup_logging("test_app", tmp_path)
 
         log_file = tmp_path / "test_app.log"
+        assert not log_file.exists()
+        logger.info("First message")
         assert log_file.exists()
 
+    def test_setup_logging_is_idempotent(self, tmp_path: Path) -> None:
+        """Test repeated calls reuse the existing handlers."""
+        first = setup_logging("test_repeat", tmp_path)
+        handlers = list(first.handlers)
+
+        second = setup_logging("test_repeat", tmp_path)
+
+        assert second is first
+        assert second.handlers == handlers
+
     def test_setup_logging_writes_to_file(self, tmp_path: Path) -> None:
         """Test log messages are written to file."""
         logger = setup_logging("test_writer", tmp_path)
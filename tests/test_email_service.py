@@ -1,13 +1,31 @@
 """Tests for email_service module."""
 
+import smtplib
+from collections.abc import Iterator
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
 import pandas as pd
 import pytest
 
 from src.email_service import (
+    REPORT_COLUMNS,
+    EmailSender,
     build_top_resolutions_payload,
+    enviar_email,
     generar_html_email_styled,
     generar_resumen_ejecutivo_fallback,
+    generar_resumen_ejecutivo_llm,
 )
+from src.models import ResumenEjecutivo
+
+EXPECTED_TOP_COLS = ("Titulo_Generado", "Fecha Publicación", "Resumen", "Enlace")
+
+
+def fake_completion(paragraph: str) -> SimpleNamespace:
+    """Build a parsed chat completion whose summary is paragraph."""
+    message = SimpleNamespace(parsed=ResumenEjecutivo(paragraph=paragraph))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
 
 
 class TestBuildTopResolutionsPayload:
@@ -17,33 +35,42 @@ class TestBuildTopResolutionsPayload:
         """Test with empty DataFrame returns empty DataFrame."""
         result = build_top_resolutions_payload(pd.DataFrame())
 
-        assert isinstance(result, pd.DataFrame)
-        assert result.empty
+        pd.testing.assert_frame_equal(result, pd.DataFrame())
 
     def test_build_top_resolutions_payload_none(self) -> None:
         """Test with None returns empty DataFrame."""
         result = build_top_resolutions_payload(None)
 
-        assert isinstance(result, pd.DataFrame)
-        assert result.empty
+        pd.testing.assert_frame_equal(result, pd.DataFrame())
 
     def test_build_top_resolutions_payload_selects_top_n(
         self, sample_regulations_df: pd.DataFrame
     ) -> None:
-        """Test selects top N by relevance."""
+        """Test selects top N by relevance, sorted descending, with report columns."""
         result = build_top_resolutions_payload(sample_regulations_df, top_n=3)
 
-        assert len(result) == 3
-        # Should be sorted by relevance descending
-        assert result.iloc[0]["Relevancia"] >= result.iloc[1]["Relevancia"]
-        assert result.iloc[1]["Relevancia"] >= result.iloc[2]["Relevancia"]
+        expected = sample_regulations_df.sort_values("Relevancia", ascending=False)
+        pd.testing.assert_frame_equal(
+            result.reset_index(drop=True),
+            expected.head(3)[REPORT_COLUMNS].reset_index(drop=True),
+            check_like=True,
+        )
 
-    def test_build_top_resolutions_payload_fewer_than_n(
+    def test_build_top_resolutions_payload_duplicate_index(
         self, sample_regulations_df: pd.DataFrame
+    ) -> None:
+        """Test repeated index labels still yield exactly top_n rows."""
+        df = sample_regulations_df.set_axis([0, 0, 1, 1, 2])
+
+        result = build_top_resolutions_payload(df, top_n=3)
+
+        assert list(result["Relevancia"]) == [95, 88, 82]
+
+    def test_build_top_resolutions_payload_fewer_than_n(
+        self, sample_regulations_df_head2: pd.DataFrame
     ) -> None:
         """Test handles fewer rows than requested."""
-        small_df = sample_regulations_df.head(2)
-        result = build_top_resolutions_payload(small_df, top_n=5)
+        result = build_top_resolutions_payload(sample_regulations_df_head2, top_n=5)
 
         assert len(result) == 2
 
@@ -53,8 +80,7 @@ class TestBuildTopResolutionsPayload:
         """Test result includes required columns."""
         result = build_top_resolutions_payload(sample_regulations_df, top_n=3)
 
-        expected_cols = ["Titulo_Generado", "Fecha Publicación", "Resumen", "Enlace"]
-        for col in expected_cols:
+        for col in EXPECTED_TOP_COLS:
             assert col in result.columns
 
     def test_build_top_resolutions_payload_without_relevancia(self) -> None:
@@ -123,85 +149,293 @@ class TestGenerarResumenEjecutivoFallback:
         assert "href=" in result
         assert "boletinoficial.gob.ar" in result
 
+    def test_fallback_escapes_values_and_rejects_unsafe_links(
+        self, sample_regulations_df: pd.DataFrame
+    ) -> None:
+        """Test titles are escaped and non-http links are replaced by '#'."""
+        df = sample_regulations_df.head(1).copy()
+        df["Titulo_Generado"] = "Soja <b>urgente</b>"
+        df["Enlace"] = "javascript:alert(1)"
 
-class TestGenerarHtmlEmailStyled:
-    """Tests for generar_html_email_styled function - basic structure only."""
+        result = generar_resumen_ejecutivo_fallback(df, "la última semana")
 
-    def test_styled_html_not_empty_with_empty_df(self) -> None:
-        """Test generates basic structure even with empty DataFrame."""
-        # Note: This test doesn't call the actual function to avoid API calls
-        # Instead, we test the fallback behavior of related functions
-        from unittest.mock import MagicMock, patch
+        assert "Soja &lt;b&gt;urgente&lt;/b&gt;" in result
+        assert "javascript:" not in result
+        assert 'href="#"' in result
 
-        empty_df = pd.DataFrame()
-        config = MagicMock()
-        config.openai_api_key = "test-key"
-        config.summary_model = "gpt-4o-mini"
+    def test_fallback_lists_top_n_items_in_order(
+        self, sample_regulations_df: pd.DataFrame
+    ) -> None:
+        """Test one list item per top regulation, highest relevance first."""
+        result = generar_resumen_ejecutivo_fallback(
+            sample_regulations_df, "la última semana", top_n=2
+        )
 
-        # Mock OpenAI to avoid actual API calls
-        with patch("src.email_service.OpenAI") as mock_openai:
-            mock_client = MagicMock()
-            mock_openai.return_value = mock_client
+        assert result.count("<li") == 2
+        assert result.index("boletinoficial.gob.ar/1") < result.index(
+            "boletinoficial.gob.ar/2"
+        )
+
+    def test_fallback_formats_stored_dates(
+        self, sample_regulations_df: pd.DataFrame
+    ) -> None:
+        """Test dates read back from storage are shown as dd/mm/YYYY."""
+        df = sample_regulations_df.assign(
+            **{"Fecha Publicación": pd.Timestamp(2024, 10, 15)}
+        )
 
-            mock_completion = MagicMock()
-            mock_completion.choices = [MagicMock()]
-            mock_completion.choices[0].message.content = "<p>Test summary</p>"
-            mock_client.chat.completions.create.return_value = mock_completion
+        result = generar_resumen_ejecutivo_fallback(df, "la última semana")
 
-            result = generar_html_email_styled(empty_df, config)
+        assert "15/10/2024" in result
+        assert "00:00:00" not in result
 
-            assert isinstance(result, str)
-            assert "<div" in result
-            assert "Boletín Oficial" in result
 
-    def test_styled_html_structure_with_data(
+class TestGenerarResumenEjecutivoLlm:
+    """Tests for generar_resumen_ejecutivo_llm function."""
+
+    def test_llm_summary_sends_top_items(
         self, sample_regulations_df: pd.DataFrame
     ) -> None:
-        """Test generates proper HTML structure with data."""
-        from unittest.mock import MagicMock, patch
+        """Test the top regulations are sent in order and the reply is rendered."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.return_value = fake_completion(
+            "Resumen <semanal>"
+        )
 
-        config = MagicMock()
-        config.openai_api_key = "test-key"
-        config.summary_model = "gpt-4o-mini"
+        result = generar_resumen_ejecutivo_llm(
+            sample_regulations_df, client, top_n=2
+        )
 
-        with patch("src.email_service.OpenAI") as mock_openai:
-            mock_client = MagicMock()
-            mock_openai.return_value = mock_client
+        kwargs = client.beta.chat.completions.parse.call_args.kwargs
+        content = kwargs["messages"][1]["content"]
+        assert kwargs["response_format"] is ResumenEjecutivo
+        assert "'relevance': 95.0" in content
+        assert content.index("exportación de soja") < content.index(
+            "aranceles agrícolas"
+        )
+        assert "precios mínimos" not in content
+        assert "Resumen ejecutivo" in result
+        assert "Resumen &lt;semanal&gt;" in result
+        assert result.count("<li") == 2
 
-            mock_completion = MagicMock()
-            mock_completion.choices = [MagicMock()]
-            mock_completion.choices[0].message.content = "<p>Test summary</p>"
-            mock_client.chat.completions.create.return_value = mock_completion
+    def test_llm_summary_empty_paragraph_uses_fallback(
+        self, sample_regulations_df: pd.DataFrame
+    ) -> None:
+        """Test an empty paragraph falls back to the local summary."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.return_value = fake_completion(" ")
 
-            result = generar_html_email_styled(sample_regulations_df, config)
+        result = generar_resumen_ejecutivo_llm(
+            sample_regulations_df, client, period_label="la semana", top_n=2
+        )
 
-            assert isinstance(result, str)
-            # Check main structure
-            assert "<h1" in result
-            assert "Boletín Oficial" in result
-            # Check regulations are included
-            assert "Ver resolución completa" in result
+        assert "resoluciones relevantes de la semana" in result
 
-    def test_styled_html_uses_fallback_on_error(
+    def test_llm_summary_error_reuses_top_rows(
+        self, sample_regulations_df: pd.DataFrame
+    ) -> None:
+        """Test the fallback after an API error does not rank the rows again."""
+        client = MagicMock()
+        client.beta.chat.completions.parse.side_effect = Exception("API Error")
+
+        with patch(
+            "src.email_service.build_top_resolutions_payload",
+            wraps=build_top_resolutions_payload,
+        ) as mock_payload:
+            result = generar_resumen_ejecutivo_llm(
+                sample_regulations_df, client, top_n=2
+            )
+
+        mock_payload.assert_called_once()
+        assert result.count("<li") == 2
+
+    def test_llm_summary_skipped_for_small_reports(
         self, sample_regulations_df: pd.DataFrame
     ) -> None:
-        """Test falls back to local summary on API error."""
-        from unittest.mock import MagicMock, patch
+        """Test the model is not called when every regulation fits in the top list."""
+        client = MagicMock()
+
+        result = generar_resumen_ejecutivo_llm(
+            sample_regulations_df.head(3), client, period_label="la semana", top_n=3
+        )
+
+        client.beta.chat.completions.parse.assert_not_called()
+        assert "resoluciones relevantes de la semana" in result
+
 
+class TestGenerarHtmlEmailStyled:
+    """Tests for generar_html_email_styled function - basic structure only."""
+
+    @pytest.fixture
+    def config(self) -> MagicMock:
+        """Return a configuration with the LLM summary enabled."""
         config = MagicMock()
         config.openai_api_key = "test-key"
         config.summary_model = "gpt-4o-mini"
+        config.skip_llm_summary = False
+        return config
+
+    @pytest.fixture(autouse=True)
+    def mock_get_client(self) -> Iterator[MagicMock]:
+        """Patch the client factory so no test reaches the OpenAI API."""
+        with patch("src.email_service.get_client") as mock_get_client:
+            client = mock_get_client.return_value
+            client.beta.chat.completions.parse.return_value = fake_completion(
+                "Test summary"
+            )
+            yield mock_get_client
+
+    @pytest.mark.parametrize(
+        "df_fixture,side_effect,must_contain",
+        [
+            ("empty_df", None, ["<div", "Boletín Oficial"]),
+            (
+                "sample_regulations_df",
+                None,
+                ["<h1", "Boletín Oficial", "Ver resolución completa"],
+            ),
+            (
+                "sample_regulations_df",
+                Exception("API Error"),
+                ["<div", "Resumen ejecutivo"],
+            ),
+        ],
+        ids=["empty", "with_data", "fallback_on_error"],
+    )
+    def test_styled_html_structure(
+        self,
+        request: pytest.FixtureRequest,
+        config: MagicMock,
+        mock_get_client: MagicMock,
+        df_fixture: str,
+        side_effect: Exception | None,
+        must_contain: list[str],
+    ) -> None:
+        """Test the email structure with and without data, and on API errors."""
+        df = request.getfixturevalue(df_fixture)
+        client = mock_get_client.return_value
+        client.beta.chat.completions.parse.side_effect = side_effect
+
+        result = generar_html_email_styled(df, config)
+
+        assert isinstance(result, str)
+        for expected in must_contain:
+            assert expected in result
+
+    def test_styled_html_escapes_values(
+        self, sample_regulations_df: pd.DataFrame, config: MagicMock
+    ) -> None:
+        """Test titles and summaries are HTML-escaped in the regulation blocks."""
+        df = sample_regulations_df.head(1).copy()
+        df["Titulo_Generado"] = "Soja <script>alert(1)</script>"
+        df["Resumen"] = "Aranceles & retenciones"
+
+        with patch("src.email_service.generar_resumen_ejecutivo_llm", return_value=""):
+            result = generar_html_email_styled(df, config)
+
+        assert "<script>" not in result
+        assert "Soja &lt;script&gt;" in result
+        assert "Aranceles &amp; retenciones" in result
+        assert result.count("Ver resolución completa") == 1
+
+    @pytest.mark.parametrize("skip,model", [(True, "gpt-4o-mini"), (False, "")])
+    def test_styled_html_skips_llm_when_disabled(
+        self,
+        sample_regulations_df: pd.DataFrame,
+        config: MagicMock,
+        mock_get_client: MagicMock,
+        skip: bool,
+        model: str,
+    ) -> None:
+        """Test the local summary is used without a client when the LLM is off."""
+        config.summary_model = model
+        config.skip_llm_summary = skip
+
+        result = generar_html_email_styled(sample_regulations_df, config)
+
+        mock_get_client.assert_not_called()
+        assert "resoluciones relevantes de" in result
+
 
-        with patch("src.email_service.OpenAI") as mock_openai:
-            mock_client = MagicMock()
-            mock_openai.return_value = mock_client
+class TestEmailSender:
+    """Tests for EmailSender and enviar_email."""
+
+    @pytest.fixture
+    def config(self) -> MagicMock:
+        """Return a configuration with SMTP settings."""
+        config = MagicMock()
+        config.smtp_server = "smtp.example.com"
+        config.smtp_port = 587
+        config.email_from = "from@example.com"
+        config.email_password = "secret"
+        config.email_per_recipient = False
+        return config
+
+    def test_sender_logs_in_once_for_several_messages(
+        self, config: MagicMock
+    ) -> None:
+        """Test one connection and login are shared by every message sent."""
+        with patch("src.email_service.smtplib.SMTP") as mock_smtp:
+            with EmailSender(config) as sender:
+                sender.send(MagicMock())
+                sender.send(MagicMock())
+
+        smtp = mock_smtp.return_value
+        mock_smtp.assert_called_once_with("smtp.example.com", 587)
+        smtp.starttls.assert_called_once()
+        smtp.login.assert_called_once_with("from@example.com", "secret")
+        assert smtp.send_message.call_count == 2
+        smtp.quit.assert_called_once()
+
+    def test_sender_closes_connection_when_login_fails(
+        self, config: MagicMock
+    ) -> None:
+        """Test a failed login closes the socket and propagates the error."""
+        with patch("src.email_service.smtplib.SMTP") as mock_smtp:
+            smtp = mock_smtp.return_value
+            smtp.login.side_effect = smtplib.SMTPAuthenticationError(535, b"no")
 
-            # Simulate API error
-            mock_client.chat.completions.create.side_effect = Exception("API Error")
+            with pytest.raises(smtplib.SMTPAuthenticationError):
+                with EmailSender(config):
+                    pass
 
-            result = generar_html_email_styled(sample_regulations_df, config)
+        smtp.close.assert_called_once()
 
-            # Should still generate HTML using fallback
-            assert isinstance(result, str)
-            assert "<div" in result
-            assert "Resumen ejecutivo" in result
+    def test_sender_keeps_send_error_when_quit_fails(
+        self, config: MagicMock
+    ) -> None:
+        """Test a reset connection on quit does not hide the failed send."""
+        with patch("src.email_service.smtplib.SMTP") as mock_smtp:
+            smtp = mock_smtp.return_value
+            smtp.send_message.side_effect = smtplib.SMTPRecipientsRefused({})
+            smtp.quit.side_effect = ConnectionResetError
+
+            with pytest.raises(smtplib.SMTPRecipientsRefused):
+                with EmailSender(config) as sender:
+                    sender.send(MagicMock())
+
+        smtp.close.assert_called_once()
+
+    def test_enviar_email_sends_one_message_to_all_recipients(
+        self, config: MagicMock
+    ) -> None:
+        """Test a recipient list is addressed in a single message."""
+        with patch("src.email_service.smtplib.SMTP") as mock_smtp:
+            enviar_email(["a@example.com", "b@example.com"], "<p>x</p>", config)
+
+        msg = mock_smtp.return_value.send_message.call_args.args[0]
+        assert msg["To"] == "a@example.com, b@example.com"
+        assert msg["From"] == "from@example.com"
+
+    def test_enviar_email_per_recipient_shares_connection(
+        self, config: MagicMock
+    ) -> None:
+        """Test each recipient gets its own message over a single login."""
+        config.email_per_recipient = True
+        with patch("src.email_service.smtplib.SMTP") as mock_smtp:
+            enviar_email(["a@example.com", "b@example.com"], "<p>x</p>", config)
+
+        smtp = mock_smtp.return_value
+        smtp.login.assert_called_once()
+        sent = [call.args[0]["To"] for call in smtp.send_message.call_args_list]
+        assert sent == ["a@example.com", "b@example.com"]
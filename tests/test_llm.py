@@ -0,0 +1,31 @@
+"""Tests for llm module."""
+
+from unittest.mock import patch
+
+from src.llm import get_client
+
+
+class TestGetClient:
+    """Tests for get_client function."""
+
+    def test_get_client_is_shared(self) -> None:
+        """Test the same settings return the same client instance."""
+        get_client.cache_clear()
+        with patch("openai.OpenAI") as mock_openai:
+            first = get_client("sk-test", 5)
+            second = get_client("sk-test", 5)
+        get_client.cache_clear()
+
+        assert first is second
+        mock_openai.assert_called_once_with(api_key="sk-test", max_retries=5)
+
+    def test_get_client_passes_timeout(self) -> None:
+        """Test a request timeout is forwarded to the client when given."""
+        get_client.cache_clear()
+        with patch("openai.OpenAI") as mock_openai:
+            get_client("sk-test", 5, 30.0)
+        get_client.cache_clear()
+
+        mock_openai.assert_called_once_with(
+            api_key="sk-test", max_retries=5, timeout=30.0
+        )
@@ -0,0 +1,106 @@
+"""Tests for llm_cache module."""
+
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from src.llm_cache import LLMCache, cached, make_key
+
+FALLBACK = {"value": "error"}
+
+
+class TestMakeKey:
+    """Tests for make_key function."""
+
+    def test_make_key_is_deterministic(self) -> None:
+        """Test same inputs produce the same key."""
+        assert make_key("classify", "m", "text") == make_key("classify", "m", "text")
+
+    def test_make_key_depends_on_all_parts(self) -> None:
+        """Test kind, model and text all change the key."""
+        base = make_key("classify", "m", "text")
+
+        assert make_key("summarize", "m", "text") != base
+        assert make_key("classify", "other", "text") != base
+        assert make_key("classify", "m", "other") != base
+
+    def test_make_key_ignores_whitespace_and_unicode_form(self) -> None:
+        """Test re-scraped copies with different spacing share a key."""
+        base = make_key("classify", "m", "Resolución 12/2024\nsobre soja")
+
+        variant = "  Resolucio\u0301n 12/2024  sobre\tsoja "
+        assert make_key("classify", "m", variant) == base
+        assert make_key("classify", "m", "Resolución 122024 sobre soja") != base
+
+
+class TestLLMCache:
+    """Tests for LLMCache class."""
+
+    def test_cache_roundtrip(self, tmp_path: Path) -> None:
+        """Test stored values are returned on lookup."""
+        with LLMCache(tmp_path / "cache.sqlite") as cache:
+            assert cache.get("k") is None
+            cache.set("k", {"summary": "Resumen", "key_points": ["a"]})
+            assert cache.get("k") == {"summary": "Resumen", "key_points": ["a"]}
+
+    def test_cache_persists_across_instances(self, tmp_path: Path) -> None:
+        """Test values survive reopening the database."""
+        path = tmp_path / "nested" / "cache.sqlite"
+        with LLMCache(path) as cache:
+            cache.set("k", {"value": 1})
+
+        with LLMCache(path) as cache:
+            assert cache.get("k") == {"value": 1}
+
+    def test_cache_serves_recent_entries_from_memory(self, tmp_path: Path) -> None:
+        """Test recently used keys are read without querying the database."""
+        with LLMCache(tmp_path / "cache.sqlite", memory_size=1) as cache:
+            cache.set("k", {"value": 1})
+            cache._conn.execute("DELETE FROM responses")
+
+            assert cache.get("k") == {"value": 1}
+
+            cache.set("other", {"value": 2})
+            assert cache.get("k") is None
+
+    def test_cache_returns_independent_copies(self, tmp_path: Path) -> None:
+        """Test mutating a returned value does not change the cached entry."""
+        with LLMCache(tmp_path / "cache.sqlite") as cache:
+            cache.set("k", {"key_points": ["a"]})
+            cache.get("k")["key_points"].append("b")
+
+            assert cache.get("k") == {"key_points": ["a"]}
+
+
+class TestCached:
+    """Tests for cached decorator."""
+
+    def test_cached_skips_repeat_calls(self, tmp_path: Path) -> None:
+        """Test a cache hit does not call the wrapped function again."""
+        fn = MagicMock(return_value={"value": "ok"})
+        wrapped = cached("kind", FALLBACK)(fn)
+
+        with LLMCache(tmp_path / "cache.sqlite") as cache:
+            first = wrapped(None, "text", "model", cache=cache)
+            second = wrapped(None, "text", "model", cache=cache)
+
+        assert first == second == {"value": "ok"}
+        assert fn.call_count == 1
+
+    def test_cached_does_not_store_fallback(self, tmp_path: Path) -> None:
+        """Test error results are retried on the next call."""
+        fn = MagicMock(return_value=dict(FALLBACK))
+        wrapped = cached("kind", FALLBACK)(fn)
+
+        with LLMCache(tmp_path / "cache.sqlite") as cache:
+            wrapped(None, "text", "model", cache=cache)
+            wrapped(None, "text", "model", cache=cache)
+
+        assert fn.call_count == 2
+
+    def test_cached_without_cache_calls_through(self) -> None:
+        """Test calls go straight to the function when no cache is given."""
+        fn = MagicMock(return_value={"value": "ok"})
+        wrapped = cached("kind", FALLBACK)(fn)
+
+        assert wrapped(None, "text", "model") == {"value": "ok"}
+        fn.assert_called_once_with(None, "text", "model")
@@ -0,0 +1,217 @@
+"""Tests for scraper module."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from lxml import html
+
+from src.scraper import (
+    MAX_RESPONSE_BYTES,
+    REQUEST_TIMEOUT,
+    URL_BASE,
+    crear_sesion,
+    obtener_detalles_aviso,
+    obtener_fecha_publicacion,
+    scrape_regulations,
+)
+
+SECCION_HTML = """
+<html><body>
+  <div class="margin-bottom-20 fecha-ultima-edicion">
+    <h6>Primera sección</h6>
+    <h6> 15 de Octubre de 2024 </h6>
+  </div>
+  <div class="col-md-12 avisosSeccionDiv">
+    <a href="/detalleAviso/primera/1">Aviso 1</a>
+    <a href="/detalleAviso/primera/2">Aviso 2</a>
+  </div>
+  <div class="col-md-12 avisosSeccionDiv">
+    <a href="/detalleAviso/primera/3">Aviso 3</a>
+  </div>
+  <a href="/seccion/segunda">Segunda sección</a>
+</body></html>
+"""
+
+DETALLE_HTML = """
+<html><head><meta charset="utf-8"></head><body>
+  <div id="tituloDetalleAviso"> MINISTERIO DE ECONOMÍA </div>
+  <div id="cuerpoDetalleAviso">
+    <p>Resolución sobre exportación de soja.</p>
+    <p>Artículo 1°.</p>
+  </div>
+  <footer>Pie de página</footer>
+</body></html>
+"""
+
+
+def mock_response(content: bytes) -> MagicMock:
+    """Return a streamed response that yields content in small chunks."""
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.content = content
+    response.headers = {"Content-Type": "text/html"}
+    response.iter_content.side_effect = lambda size: (
+        content[i : i + 64] for i in range(0, len(content), 64)
+    )
+    return response
+
+
+def mock_session(content: bytes) -> MagicMock:
+    """Return a session whose get() responds with the given body."""
+    session = MagicMock()
+    session.get.return_value = mock_response(content)
+    return session
+
+
+class TestObtenerFechaPublicacion:
+    """Tests for obtener_fecha_publicacion function."""
+
+    def test_obtener_fecha_publicacion(self) -> None:
+        """Test Spanish date heading is converted to dd/mm/YYYY."""
+        tree = html.fromstring(SECCION_HTML)
+
+        assert obtener_fecha_publicacion(tree) == "15/10/2024"
+
+    @pytest.mark.parametrize(
+        "mes,numero",
+        [
+            ("Enero", "01"),
+            ("Mayo", "05"),
+            ("Septiembre", "09"),
+            ("Setiembre", "09"),
+            ("Diciembre", "12"),
+        ],
+    )
+    def test_obtener_fecha_publicacion_months(self, mes: str, numero: str) -> None:
+        """Test every month name is recognized."""
+        tree = html.fromstring(SECCION_HTML.replace("Octubre", mes))
+
+        assert obtener_fecha_publicacion(tree) == f"15/{numero}/2024"
+
+    def test_obtener_fecha_publicacion_lowercase_single_digit(self) -> None:
+        """Test lowercase month names and single-digit days are accepted."""
+        page = SECCION_HTML.replace("15 de Octubre", "5 de octubre")
+        tree = html.fromstring(page)
+
+        assert obtener_fecha_publicacion(tree) == "05/10/2024"
+
+    def test_obtener_fecha_publicacion_invalid(self) -> None:
+        """Test unknown month names raise ValueError."""
+        tree = html.fromstring(SECCION_HTML.replace("Octubre", "Brumario"))
+
+        with pytest.raises(ValueError, match="Brumario"):
+            obtener_fecha_publicacion(tree)
+
+
+class TestObtenerDetallesAviso:
+    """Tests for obtener_detalles_aviso function."""
+
+    def test_obtener_detalles_aviso(self) -> None:
+        """Test title and body are extracted from the detail page."""
+        session = mock_session(DETALLE_HTML.encode("utf-8"))
+
+        result = obtener_detalles_aviso(session, "https://x/1")
+
+        assert result["Título"] == "MINISTERIO DE ECONOMÍA"
+        assert result["Texto"].split() == (
+            "Resolución sobre exportación de soja. Artículo 1°.".split()
+        )
+        assert result["Enlace"] == "https://x/1"
+
+    def test_obtener_detalles_aviso_stops_parsing_after_nodes(self) -> None:
+        """Test the rest of the page is read but not parsed once nodes are found."""
+        trailer = b"<div id='tituloDetalleAviso'>Otro</div>" * 50
+        session = mock_session(DETALLE_HTML.encode("utf-8") + trailer)
+
+        result = obtener_detalles_aviso(session, "https://x/1")
+
+        assert result["Título"] == "MINISTERIO DE ECONOMÍA"
+
+    def test_obtener_detalles_aviso_uses_timeout(self) -> None:
+        """Test detail requests are streamed with a bounded timeout."""
+        session = mock_session(DETALLE_HTML.encode("utf-8"))
+
+        obtener_detalles_aviso(session, "https://x/1")
+
+        session.get.assert_called_once_with(
+            "https://x/1", stream=True, timeout=REQUEST_TIMEOUT
+        )
+
+    def test_obtener_detalles_aviso_rejects_large_pages(self) -> None:
+        """Test pages over the size cap are abandoned and return None."""
+        trailer = b" " * (MAX_RESPONSE_BYTES + 1)
+        session = mock_session(DETALLE_HTML.encode("utf-8") + trailer)
+
+        assert obtener_detalles_aviso(session, "https://x/1") is None
+
+    def test_obtener_detalles_aviso_http_error(self) -> None:
+        """Test HTTP errors are logged and return None."""
+        session = mock_session(b"")
+        session.get.return_value.raise_for_status.side_effect = (
+            requests.HTTPError("500")
+        )
+
+        assert obtener_detalles_aviso(session, "https://x/1") is None
+
+    def test_obtener_detalles_aviso_missing_nodes(self) -> None:
+        """Test pages without the expected nodes return None."""
+        session = mock_session(b"<html><body></body></html>")
+
+        assert obtener_detalles_aviso(session, "https://x/1") is None
+
+
+class TestScrapeRegulations:
+    """Tests for scrape_regulations function."""
+
+    def test_scrape_regulations_collects_all_notices(self) -> None:
+        """Test every notice link is fetched and dated, in page order."""
+
+        def fake_get(url: str, **kwargs) -> MagicMock:
+            if url.endswith("/seccion/primera"):
+                return mock_response(SECCION_HTML.encode("utf-8"))
+            return mock_response(DETALLE_HTML.encode("utf-8"))
+
+        with patch("src.scraper.crear_sesion") as mock_crear_sesion:
+            session = mock_crear_sesion.return_value.__enter__.return_value
+            session.get.side_effect = fake_get
+
+            result = scrape_regulations(max_workers=2)
+
+        assert list(result["Enlace"]) == [
+            f"{URL_BASE}/detalleAviso/primera/{i}" for i in (1, 2, 3)
+        ]
+        assert set(result["Fecha Publicación"]) == {"15/10/2024"}
+        assert set(result["Título"]) == {"MINISTERIO DE ECONOMÍA"}
+
+    def test_scrape_regulations_without_notices(self) -> None:
+        """Test a section without notices yields an empty frame with all columns."""
+        page = SECCION_HTML.replace("avisosSeccionDiv", "otraSeccion")
+
+        with patch("src.scraper.crear_sesion") as mock_crear_sesion:
+            session = mock_crear_sesion.return_value.__enter__.return_value
+            session.get.return_value = mock_response(page.encode("utf-8"))
+
+            result = scrape_regulations(max_workers=2)
+
+        assert result.empty
+        assert list(result.columns) == [
+            "Título",
+            "Texto",
+            "Enlace",
+            "Fecha Publicación",
+        ]
+
+
+class TestCrearSesion:
+    """Tests for crear_sesion function."""
+
+    def test_crear_sesion_configures_pool_and_retries(self) -> None:
+        """Test the HTTPS adapter is pooled and retries transient errors."""
+        with crear_sesion(pool_size=8) as session:
+            adapter = session.get_adapter("https://www.boletinoficial.gob.ar")
+
+            assert adapter._pool_maxsize == 8
+            assert adapter.max_retries.total == 5
+            assert 503 in adapter.max_retries.status_forcelist
+            assert "gzip" in session.headers["Accept-Encoding"]
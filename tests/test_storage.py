@@ -1,13 +1,34 @@
 """Tests for storage module."""
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from unittest.mock import MagicMock
+from unittest.mock import patch
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 
-from src.storage import get_recent_regulations, load_regulations, save_regulations
+from src.storage import (
+    dataset_path,
+    export_regulations_excel,
+    get_recent_regulations,
+    load_regulations,
+    save_regulations,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class FakeConfig:
+    """Stand-in for Config with the only setting storage reads."""
+
+    excel_path: Path
+
+
+def read_dataset(config: FakeConfig) -> pd.DataFrame:
+    """Read the stored Parquet dataset for config."""
+    return pd.read_parquet(dataset_path(config))
 
 
 class TestLoadRegulations:
@@ -18,16 +39,16 @@ class TestLoadRegulations:
         non_existent = tmp_path / "does_not_exist.xlsx"
         result = load_regulations(non_existent)
 
-        assert isinstance(result, pd.DataFrame)
-        assert result.empty
+        pd.testing.assert_frame_equal(result, pd.DataFrame())
 
-    def test_load_regulations_with_data(self, test_data_path: Path) -> None:
+    def test_load_regulations_with_data(
+        self, loaded_test_data: pd.DataFrame, sample_regulations_df: pd.DataFrame
+    ) -> None:
         """Test loading from existing file returns DataFrame with data."""
-        result = load_regulations(test_data_path)
-
-        assert isinstance(result, pd.DataFrame)
-        assert not result.empty
-        assert "Fecha Publicación" in result.columns
+        assert isinstance(loaded_test_data, pd.DataFrame)
+        assert not loaded_test_data.empty
+        assert "Fecha Publicación" in loaded_test_data.columns
+        assert len(loaded_test_data) == len(sample_regulations_df)
 
     def test_load_regulations_invalid_file(self, tmp_path: Path) -> None:
         """Test loading invalid file raises exception."""
@@ -41,59 +62,116 @@ class TestLoadRegulations:
 class TestSaveRegulations:
     """Tests for save_regulations function."""
 
-    def test_save_regulations_creates_file(
+    def test_save_regulations_creates_dataset(
         self, sample_regulations_df: pd.DataFrame, tmp_path: Path
     ) -> None:
-        """Test saving creates new Excel file."""
-        excel_path = tmp_path / "new_file.xlsx"
-        config = MagicMock()
-        config.excel_path = excel_path
+        """Test saving creates a new Parquet dataset."""
+        config = FakeConfig(excel_path=tmp_path / "new_file.xlsx")
 
         save_regulations(sample_regulations_df, config)
 
-        assert excel_path.exists()
-        loaded = pd.read_excel(excel_path, sheet_name="resoluciones_relevantes")
-        assert len(loaded) == len(sample_regulations_df)
+        assert dataset_path(config).is_dir()
+        assert len(read_dataset(config)) == len(sample_regulations_df)
 
     def test_save_regulations_appends(
-        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+        self,
+        sample_regulations_df: pd.DataFrame,
+        sample_regulations_df_head2: pd.DataFrame,
+        tmp_path: Path,
     ) -> None:
-        """Test saving appends to existing file."""
-        excel_path = tmp_path / "existing.xlsx"
-        config = MagicMock()
-        config.excel_path = excel_path
+        """Test saving appends a new file instead of rewriting the dataset."""
+        config = FakeConfig(excel_path=tmp_path / "existing.xlsx")
 
-        # Save initial data
         save_regulations(sample_regulations_df, config)
-        initial_count = len(pd.read_excel(excel_path, sheet_name="resoluciones_relevantes"))
-
-        # Append more data
-        save_regulations(sample_regulations_df.head(2), config)
-
-        loaded = pd.read_excel(excel_path, sheet_name="resoluciones_relevantes")
-        assert len(loaded) == initial_count + 2
+        save_regulations(sample_regulations_df_head2, config)
+
+        loaded = read_dataset(config)
+        assert len(loaded) == len(sample_regulations_df) + 2
+        assert len(list(dataset_path(config).iterdir())) == 2
+        # Rows keep insertion order across files
+        assert list(loaded["Enlace"].tail(2)) == list(
+            sample_regulations_df_head2["Enlace"]
+        )
 
     def test_save_regulations_empty_df(self, tmp_path: Path) -> None:
         """Test saving empty DataFrame does nothing."""
-        excel_path = tmp_path / "should_not_exist.xlsx"
-        config = MagicMock()
-        config.excel_path = excel_path
+        config = FakeConfig(excel_path=tmp_path / "should_not_exist.xlsx")
 
         save_regulations(pd.DataFrame(), config)
 
-        assert not excel_path.exists()
+        assert not dataset_path(config).exists()
 
     def test_save_regulations_creates_parent_dirs(
         self, sample_regulations_df: pd.DataFrame, tmp_path: Path
     ) -> None:
         """Test saving creates parent directories if needed."""
-        excel_path = tmp_path / "nested" / "dir" / "file.xlsx"
-        config = MagicMock()
-        config.excel_path = excel_path
+        config = FakeConfig(excel_path=tmp_path / "nested" / "dir" / "file.xlsx")
+
+        save_regulations(sample_regulations_df, config)
+
+        assert dataset_path(config).exists()
+
+    def test_save_regulations_migrates_legacy_excel(
+        self,
+        sample_regulations_df: pd.DataFrame,
+        sample_xlsx_bytes: bytes,
+        tmp_path: Path,
+    ) -> None:
+        """Test rows from an existing Excel file are kept on first save."""
+        excel_path = tmp_path / "legacy.xlsx"
+        excel_path.write_bytes(sample_xlsx_bytes)
+        config = FakeConfig(excel_path=excel_path)
 
+        save_regulations(sample_regulations_df.head(1), config)
+
+        assert len(read_dataset(config)) == len(sample_regulations_df) + 1
+
+
+class TestMigrateDates:
+    """Tests for converting stored date strings to dates."""
+
+    def test_string_dates_are_converted_on_first_use(
+        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test dataset files with text dates are rewritten with date values."""
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        dataset_path(config).mkdir()
+        sample_regulations_df.to_parquet(dataset_path(config) / "old.parquet")
+
+        result = get_recent_regulations(config, days=7, archive_old=False)
+
+        part = pq.read_schema(dataset_path(config) / "old.parquet")
+        assert part.field("Fecha Publicación").type == pa.date32()
+        assert len(result) == len(sample_regulations_df)
+        assert pd.api.types.is_datetime64_any_dtype(result["Fecha Publicación"])
+
+
+class TestExportRegulationsExcel:
+    """Tests for export_regulations_excel function."""
+
+    def test_export_regulations_excel(
+        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test the Excel file is written from the dataset."""
+        config = FakeConfig(excel_path=tmp_path / "export.xlsx")
         save_regulations(sample_regulations_df, config)
 
-        assert excel_path.exists()
+        export_regulations_excel(config)
+
+        # Like pandas, import openpyxl only once a workbook is actually read
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(config.excel_path, read_only=True)
+        try:
+            header, *rows = workbook["resoluciones_relevantes"].iter_rows()
+            assert [cell.value for cell in header] == list(
+                sample_regulations_df.columns
+            )
+            assert len(rows) == len(sample_regulations_df)
+            assert isinstance(rows[0][0].value, datetime)
+            assert rows[0][0].number_format == "DD/MM/YYYY"
+        finally:
+            workbook.close()
 
 
 class TestGetRecentRegulations:
@@ -103,15 +181,8 @@ class TestGetRecentRegulations:
         self, sample_regulations_df: pd.DataFrame, tmp_path: Path
     ) -> None:
         """Test filtering regulations by date range."""
-        excel_path = tmp_path / "test.xlsx"
-
-        # Save test data
-        sample_regulations_df.to_excel(
-            excel_path, index=False, sheet_name="resoluciones_relevantes"
-        )
-
-        config = MagicMock()
-        config.excel_path = excel_path
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        save_regulations(sample_regulations_df, config)
 
         result = get_recent_regulations(config, days=3, archive_old=False)
 
@@ -121,50 +192,37 @@ class TestGetRecentRegulations:
 
     def test_get_recent_regulations_nonexistent_file(self, tmp_path: Path) -> None:
         """Test returns empty DataFrame when file doesn't exist."""
-        config = MagicMock()
-        config.excel_path = tmp_path / "nonexistent.xlsx"
+        config = FakeConfig(excel_path=tmp_path / "nonexistent.xlsx")
 
         result = get_recent_regulations(config, days=7, archive_old=False)
 
-        assert isinstance(result, pd.DataFrame)
-        assert result.empty
-
-    def test_get_recent_regulations_empty_file(self, tmp_path: Path) -> None:
-        """Test handles empty Excel file."""
-        excel_path = tmp_path / "empty.xlsx"
-
-        empty_df = pd.DataFrame(columns=[
-            "Fecha Publicación", "Titulo_Generado", "Categoria",
-            "Relevancia", "Razonamiento", "Resumen", "Puntos_Clave", "Enlace"
-        ])
-        empty_df.to_excel(excel_path, index=False, sheet_name="resoluciones_relevantes")
+        pd.testing.assert_frame_equal(result, pd.DataFrame())
 
-        config = MagicMock()
-        config.excel_path = excel_path
+    def test_get_recent_regulations_empty_file(
+        self, empty_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test handles a dataset file without rows."""
+        config = FakeConfig(excel_path=tmp_path / "empty.xlsx")
+        dataset_path(config).mkdir()
+        empty_df.to_parquet(dataset_path(config) / "empty.parquet")
 
         result = get_recent_regulations(config, days=7, archive_old=False)
 
-        assert isinstance(result, pd.DataFrame)
-        assert result.empty
+        pd.testing.assert_frame_equal(result, empty_df, check_dtype=False)
 
     def test_get_recent_regulations_archives_old(
         self, sample_regulations_df: pd.DataFrame, tmp_path: Path
     ) -> None:
         """Test archiving removes old regulations from file."""
-        excel_path = tmp_path / "test.xlsx"
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
 
         # Create data with old dates
         old_dates_df = sample_regulations_df.copy()
-        old_dates_df["Fecha Publicación"] = [
-            (datetime.now() - timedelta(days=i)).strftime("%d/%m/%Y")
-            for i in [0, 1, 10, 15, 20]  # 2 recent, 3 old
-        ]
-        old_dates_df.to_excel(
-            excel_path, index=False, sheet_name="resoluciones_relevantes"
-        )
-
-        config = MagicMock()
-        config.excel_path = excel_path
+        old_dates_df["Fecha Publicación"] = (
+            pd.Timestamp.now().normalize()
+            - pd.to_timedelta([0, 1, 10, 15, 20], unit="D")  # 2 recent, 3 old
+        ).strftime("%d/%m/%Y")
+        save_regulations(old_dates_df, config)
 
         # Get recent with archive=True
         result = get_recent_regulations(config, days=7, archive_old=True)
@@ -172,25 +230,86 @@ class TestGetRecentRegulations:
         # Verify only recent are returned
         assert len(result) == 2
 
-        # Verify file was updated (old entries removed)
-        remaining = pd.read_excel(excel_path, sheet_name="resoluciones_relevantes")
-        assert len(remaining) == 2
+        # Verify dataset was updated (old entries removed)
+        assert len(read_dataset(config)) == 2
 
     def test_get_recent_regulations_sorted_by_date(
         self, sample_regulations_df: pd.DataFrame, tmp_path: Path
     ) -> None:
         """Test results are sorted by date ascending."""
-        excel_path = tmp_path / "test.xlsx"
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        save_regulations(sample_regulations_df, config)
+
+        result = get_recent_regulations(config, days=7, archive_old=False)
+
+        assert len(result) > 1
+        assert result["Fecha Publicación"].is_monotonic_increasing
+
+    def test_get_recent_regulations_skips_invalid_dates(
+        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test rows with unparseable dates are skipped and others keep their date."""
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        df = sample_regulations_df.copy()
+        df.loc[0, "Fecha Publicación"] = "sin fecha"
+        save_regulations(df, config)
+
+        result = get_recent_regulations(config, days=7, archive_old=False)
 
-        sample_regulations_df.to_excel(
-            excel_path, index=False, sheet_name="resoluciones_relevantes"
+        assert len(result) == len(df) - 1
+        fechas = result["Fecha Publicación"].dt.strftime("%d/%m/%Y")
+        assert set(fechas) == set(df["Fecha Publicación"][1:])
+
+    def test_get_recent_regulations_prunes_only_old_files(
+        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test archiving deletes old files and leaves recent ones untouched."""
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        old_df = sample_regulations_df.head(2).copy()
+        old_df["Fecha Publicación"] = (datetime.now() - timedelta(days=30)).strftime(
+            "%d/%m/%Y"
         )
+        save_regulations(old_df, config)
+        save_regulations(sample_regulations_df, config)
+        recent_file = sorted(dataset_path(config).iterdir())[-1]
+        recent_mtime = recent_file.stat().st_mtime_ns
 
-        config = MagicMock()
-        config.excel_path = excel_path
+        result = get_recent_regulations(config, days=7, archive_old=True)
+
+        assert len(result) == len(sample_regulations_df)
+        assert list(dataset_path(config).iterdir()) == [recent_file]
+        assert recent_file.stat().st_mtime_ns == recent_mtime
+
+    def test_interrupted_prune_leaves_no_duplicate_rows(
+        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test a temporary file left by a failed prune is not read as data."""
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        old_df = sample_regulations_df.head(1).copy()
+        old_df["Fecha Publicación"] = (datetime.now() - timedelta(days=30)).strftime(
+            "%d/%m/%Y"
+        )
+        save_regulations(pd.concat([old_df, sample_regulations_df]), config)
+        with (
+            patch.object(Path, "replace", side_effect=OSError("disk full")),
+            pytest.raises(OSError),
+        ):
+            get_recent_regulations(config, days=7, archive_old=True)
 
         result = get_recent_regulations(config, days=7, archive_old=False)
 
-        if len(result) > 1:
-            dates = pd.to_datetime(result["Fecha Publicación"], format="%d/%m/%Y")
-            assert dates.is_monotonic_increasing
+        assert len(result) == len(sample_regulations_df)
+
+    def test_get_recent_regulations_reads_selected_columns(
+        self, sample_regulations_df: pd.DataFrame, tmp_path: Path
+    ) -> None:
+        """Test only the requested columns, plus the date, are returned."""
+        config = FakeConfig(excel_path=tmp_path / "test.xlsx")
+        save_regulations(sample_regulations_df, config)
+
+        result = get_recent_regulations(
+            config, days=7, archive_old=False, columns=["Titulo_Generado"]
+        )
+
+        assert list(result.columns) == ["Fecha Publicación", "Titulo_Generado"]
+        assert len(result) == len(sample_regulations_df)